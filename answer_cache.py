@@ -0,0 +1,110 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from context_builder import strip_pending_prompt
+from instrumentation import METRICS
+
+NON_WORD = re.compile(r"[^\w\s]")
+WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_question(question):
+    question = NON_WORD.sub(" ", question.lower())
+    return WHITESPACE.sub(" ", question).strip()
+
+
+def is_context_free(prompt, conversation_history):
+    return not strip_pending_prompt(prompt, conversation_history or [])
+
+
+class AnswerCache:
+    """Per-bot answer cache with an exact-match layer and an embedding-similarity layer.
+
+    Entries live in namespaces of (bot_type, source). Exact lookups compare
+    normalized question text; on a miss the question is embedded with
+    `embed_query` and compared by cosine similarity against cached questions of
+    the same namespace. Entries expire after `ttl_seconds` and each namespace
+    keeps at most `max_entries` in LRU order.
+    """
+
+    def __init__(self, embed_query, default_threshold, ttl_seconds, max_entries, thresholds=None):
+        self.embed_query = embed_query
+        self.default_threshold = default_threshold
+        self.thresholds = thresholds or {}
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.namespaces = {}
+        self.counters = {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "stores": 0}
+
+    def _entries(self, namespace):
+        entries = self.namespaces.setdefault(namespace, OrderedDict())
+        cutoff = time.time() - self.ttl_seconds
+        for key in [key for key, entry in entries.items() if entry["created"] < cutoff]:
+            del entries[key]
+        return entries
+
+    def _embed(self, question):
+        try:
+            vector = np.asarray(self.embed_query(question), dtype=np.float32)
+        except Exception:
+            # The exact layer still works when the embedding call fails
+            return None
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+
+    def lookup(self, namespace, question):
+        # Returns (answer or None, query vector); pass the vector back to store() to avoid re-embedding
+        key = normalize_question(question)
+        with self.lock:
+            entries = self._entries(namespace)
+            if key in entries:
+                entries.move_to_end(key)
+                self.counters["exact_hits"] += 1
+                METRICS.inc("answer_cache_lookups_total", result="exact", bot_type=namespace[0])
+                return entries[key]["answer"], entries[key]["vector"]
+            candidates = [(k, entry["vector"]) for k, entry in entries.items() if entry["vector"] is not None]
+
+        vector = self._embed(question)
+        if vector is not None and candidates:
+            matrix = np.stack([candidate for _, candidate in candidates])
+            scores = matrix @ vector
+            best = int(np.argmax(scores))
+            bot_type = namespace[0]
+            if scores[best] >= self.thresholds.get(bot_type, self.default_threshold):
+                best_key = candidates[best][0]
+                with self.lock:
+                    entries = self._entries(namespace)
+                    if best_key in entries:
+                        entries.move_to_end(best_key)
+                        self.counters["semantic_hits"] += 1
+                        METRICS.inc("answer_cache_lookups_total", result="semantic", bot_type=bot_type)
+                        return entries[best_key]["answer"], vector
+
+        with self.lock:
+            self.counters["misses"] += 1
+        METRICS.inc("answer_cache_lookups_total", result="miss", bot_type=namespace[0])
+        return None, vector
+
+    def store(self, namespace, question, answer, vector=None):
+        key = normalize_question(question)
+        if vector is None:
+            vector = self._embed(question)
+        with self.lock:
+            entries = self._entries(namespace)
+            entries[key] = {"answer": answer, "vector": vector, "created": time.time()}
+            entries.move_to_end(key)
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+            self.counters["stores"] += 1
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters)
+            stats["entries"] = sum(len(entries) for entries in self.namespaces.values())
+        lookups = stats["exact_hits"] + stats["semantic_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["exact_hits"] + stats["semantic_hits"]) / lookups if lookups else 0.0
+        return stats
@@ -1,19 +1,17 @@
 import time
+_imports_start = time.perf_counter()
 from dotenv import load_dotenv, find_dotenv
 import streamlit as st
-from chatbot_interface import chatbot_interface
-from PIL import Image
+from chatbot_interface import chatbot_interface, resume_session
+from config import RERUN_BUDGET_MS, SHOW_RERUN_TIMINGS, METRICS_PORT
+from rerun_timing import PROCESS_START, RerunTimings, RerunTimer
+from instrumentation import METRICS, start_metrics_server
+IMPORT_SECONDS = time.perf_counter() - _imports_start
 
 # Load environment variables
 load_dotenv(find_dotenv(".env"))
 
-def main():
-    st.set_page_config(page_title="Multi-Chatbot Application", layout="wide")
-
-    # Load and display the logo
-    logo = Image.open("logo.jpg")
-
-    st.markdown("""
+PAGE_CSS = """
     <style>
     .logo-img {
         width: 150px;
@@ -41,14 +39,63 @@ def main():
         text-align: center;
     }
     </style>
-    """, unsafe_allow_html=True)
+    """
+
+# No spinner: this runs before st.set_page_config, which must be the first element on the page
+@st.cache_resource(show_spinner=False)
+def get_rerun_timings():
+    return RerunTimings(RERUN_BUDGET_MS)
+
+# One exporter per process, however many sessions rerun the script
+@st.cache_resource(show_spinner=False)
+def get_metrics_server(port):
+    return start_metrics_server(port)
+
+# The logo is served as-is; it is read and encoded once per process instead of on every rerun
+@st.cache_data
+def load_logo_html(path):
+    import base64
+
+    with open(path, "rb") as f:
+        encoded = base64.b64encode(f.read()).decode()
+    return '<div class="logo-container"><img src="data:image/jpeg;base64,{}" class="logo-img"></div>'.format(encoded)
+
+def main():
+    timings = get_rerun_timings()
+    timings.record_cold_start("imports", IMPORT_SECONDS)
+    timings.record_cold_start("first_rerun_start", time.perf_counter() - PROCESS_START)
+    if METRICS_PORT:
+        get_metrics_server(METRICS_PORT)
+    timer = RerunTimer()
+    try:
+        render(timer)
+    finally:
+        # Runs for st.rerun() too, which unwinds the script with an exception
+        timings.record_rerun(timer.phases, timer.external)
+        for phase, ms in timer.phases.items():
+            METRICS.observe("rerun_phase_seconds", ms / 1000, phase=phase)
+        for call, ms in timer.external.items():
+            METRICS.observe("rerun_external_seconds", ms / 1000, call=call)
+
+def render(timer):
+    with timer.phase("page_setup"):
+        st.set_page_config(page_title="Multi-Chatbot Application", layout="wide")
+        st.markdown(PAGE_CSS, unsafe_allow_html=True)
 
     # Display the logo in a circular design
-    st.markdown('<div class="logo-container"><img src="data:image/png;base64,{}" class="logo-img"></div>'.format(image_to_base64(logo)), unsafe_allow_html=True)
+    with timer.phase("logo"):
+        st.markdown(load_logo_html("logo.jpg"), unsafe_allow_html=True)
 
     if 'selected_bot' not in st.session_state:
         st.session_state.selected_bot = None
 
+    # A new browser session resumes the conversation named in the URL, if the store still has it
+    if 'session_id' not in st.session_state:
+        st.session_state.session_id = None
+        resume_id = st.query_params.get("session")
+        if resume_id and not resume_session(resume_id):
+            st.query_params.pop("session", None)
+
     if st.session_state.selected_bot is None:
         st.markdown("<h1 class='stHeader'>Choose Your Chatbot</h1>", unsafe_allow_html=True)
         col1, col2 ,col3, col4,col5= st.columns(5)
@@ -77,21 +124,12 @@ def main():
         
     
     else:
-        chatbot_interface(st.session_state.selected_bot)
-
-    if 'session_id' not in st.session_state:
-        st.session_state.session_id = f"session-{int(time.time())}"
-
-    if "messages" not in st.session_state:
-        st.session_state.messages = []
-
-def image_to_base64(image):
-    import base64
-    from io import BytesIO
+        with timer.phase("chatbot"):
+            chatbot_interface(st.session_state.selected_bot, timer)
 
-    buffered = BytesIO()
-    image.save(buffered, format="PNG")
-    return base64.b64encode(buffered.getvalue()).decode()
+    if SHOW_RERUN_TIMINGS:
+        with st.sidebar.expander("Rerun timings"):
+            st.json(get_rerun_timings().summary())
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,118 @@
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from dotenv import load_dotenv
+from openai import AsyncOpenAI
+
+from chat_with_gpt import get_system_prompt, get_assistant_prompt
+from chatbot_types import CHATBOT_TYPES
+from config import MAX_TOKENS, CONTEXT_TOKEN_BUDGET
+from context_builder import build_context
+from openai_gateway import RETRYABLE_ERRORS
+from rate_limit import retry_after_seconds
+
+# Headless driver for the chat prompts: reads JSONL records of
+# {"bot_type", "question", "history"?, "id"?} and writes one JSONL result per record.
+
+
+def load_records(path):
+    records = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if record.get("bot_type") not in CHATBOT_TYPES:
+                raise ValueError(f"{path}:{line_number}: unknown bot_type {record.get('bot_type')!r}")
+            if not record.get("question"):
+                raise ValueError(f"{path}:{line_number}: missing question")
+            record.setdefault("id", line_number)
+            records.append(record)
+    return records
+
+
+async def answer_record(client, record, model, max_tokens, max_retries=5):
+    # History beyond the token budget is dropped rather than summarized, to keep runs deterministic
+    messages = build_context(
+        get_system_prompt(record["bot_type"]),
+        get_assistant_prompt(record["bot_type"]),
+        record.get("history") or [],
+        record["question"],
+        CONTEXT_TOKEN_BUDGET,
+    )
+    result = {"id": record["id"], "bot_type": record["bot_type"], "question": record["question"]}
+    start = time.perf_counter()
+    for attempt in range(max_retries):
+        try:
+            response = await client.chat.completions.create(model=model, messages=messages, max_tokens=max_tokens)
+            break
+        except RETRYABLE_ERRORS as e:
+            if attempt == max_retries - 1:
+                result.update(error=str(e), latency_ms=(time.perf_counter() - start) * 1000, retries=attempt)
+                return result
+            response = getattr(e, "response", None)
+            headers = response.headers if response is not None else None
+            await asyncio.sleep(retry_after_seconds(headers, attempt) + random.uniform(0, 1))
+        except Exception as e:
+            result.update(error=str(e), latency_ms=(time.perf_counter() - start) * 1000, retries=attempt)
+            return result
+
+    usage = response.usage
+    result.update(
+        answer=response.choices[0].message.content.strip(),
+        latency_ms=(time.perf_counter() - start) * 1000,
+        retries=attempt,
+        prompt_tokens=usage.prompt_tokens if usage else None,
+        completion_tokens=usage.completion_tokens if usage else None,
+        total_tokens=usage.total_tokens if usage else None,
+    )
+    return result
+
+
+async def run_batch(records, output_path, concurrency=16, model="gpt-4o-mini", max_tokens=MAX_TOKENS, client=None):
+    client = client or AsyncOpenAI()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def bounded(record):
+        async with semaphore:
+            return await answer_record(client, record, model, max_tokens)
+
+    start = time.perf_counter()
+    errors = 0
+    # Results are written as they complete so a long run can be tailed and survives interruption
+    with open(output_path, "w", encoding="utf-8") as f:
+        for next_result in asyncio.as_completed([bounded(record) for record in records]):
+            result = await next_result
+            errors += "error" in result
+            f.write(json.dumps(result) + "\n")
+            f.flush()
+    elapsed = time.perf_counter() - start
+    return {
+        "records": len(records),
+        "errors": errors,
+        "seconds": elapsed,
+        "questions_per_minute": len(records) / elapsed * 60 if elapsed else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a JSONL file of chatbot questions against the OpenAI API.")
+    parser.add_argument("input", help="JSONL with bot_type, question and optional history/id per line")
+    parser.add_argument("output", help="JSONL file to write answers, latencies and token usage to")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--model", default="gpt-4o-mini")
+    parser.add_argument("--max-tokens", type=int, default=MAX_TOKENS)
+    args = parser.parse_args()
+
+    load_dotenv()
+    records = load_records(args.input)
+    summary = asyncio.run(run_batch(records, args.output, args.concurrency, args.model, args.max_tokens))
+    print(json.dumps(summary))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+# Local stand-in for the OpenAI endpoints the app uses: /v1/embeddings and /v1/chat/completions
+# (plain and streaming). Latency, 429 injection and rate-limit headers are configurable so
+# benchmarks exercise the same retry and scheduling paths as production.
+
+
+def fake_embedding(text, dimensions):
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dimensions).astype(np.float32)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+class FakeOpenAIConfig:
+    def __init__(self, latency_ms=50.0, token_latency_ms=2.0, error_rate=0.0, retry_after=0.1,
+                 answer_tokens=60, tokens_per_minute=1000000, requests_per_minute=3000, seed=0):
+        self.latency_ms = latency_ms
+        self.token_latency_ms = token_latency_ms
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.answer_tokens = answer_tokens
+        self.tokens_per_minute = tokens_per_minute
+        self.requests_per_minute = requests_per_minute
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.counters = {"requests": 0, "rate_limited": 0}
+
+    def should_fail(self):
+        with self.lock:
+            self.counters["requests"] += 1
+            failed = self.random.random() < self.error_rate
+            self.counters["rate_limited"] += failed
+            return failed
+
+
+def make_handler(config):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _rate_limit_headers(self):
+            return {
+                "x-ratelimit-limit-tokens": str(config.tokens_per_minute),
+                "x-ratelimit-limit-requests": str(config.requests_per_minute),
+                "x-ratelimit-remaining-tokens": str(config.tokens_per_minute),
+                "x-ratelimit-remaining-requests": str(config.requests_per_minute),
+            }
+
+        def _send_json(self, status, body, headers=None):
+            payload = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            for name, value in {**self._rate_limit_headers(), **(headers or {})}.items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+            time.sleep(config.latency_ms / 1000)
+            if config.should_fail():
+                self._send_json(
+                    429,
+                    {"error": {"message": "Rate limit reached (injected)", "type": "rate_limit_exceeded", "code": "rate_limit_exceeded"}},
+                    {"retry-after": str(config.retry_after)},
+                )
+                return
+            if self.path.endswith("/embeddings"):
+                self._embeddings(request)
+            elif self.path.endswith("/chat/completions"):
+                self._chat(request)
+            else:
+                self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+        def _embeddings(self, request):
+            texts = request["input"] if isinstance(request["input"], list) else [request["input"]]
+            dimensions = request.get("dimensions") or 1536
+            tokens = sum(len(text) // 4 + 1 for text in texts)
+            self._send_json(200, {
+                "object": "list",
+                "model": request.get("model"),
+                "data": [
+                    {"object": "embedding", "index": i, "embedding": fake_embedding(text, dimensions)}
+                    for i, text in enumerate(texts)
+                ],
+                "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+            })
+
+        def _chat(self, request):
+            prompt_tokens = sum(len(json.dumps(message.get("content"))) // 4 + 1 for message in request["messages"])
+            words = [f"word{i}" for i in range(min(config.answer_tokens, request.get("max_tokens") or config.answer_tokens))]
+            base = {"id": "chatcmpl-fake", "created": int(time.time()), "model": request.get("model")}
+            if not request.get("stream"):
+                time.sleep(len(words) * config.token_latency_ms / 1000)
+                self._send_json(200, {
+                    **base,
+                    "object": "chat.completion",
+                    "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": " ".join(words)}}],
+                    "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(words), "total_tokens": prompt_tokens + len(words)},
+                })
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            for name, value in self._rate_limit_headers().items():
+                self.send_header(name, value)
+            self.end_headers()
+            for i, word in enumerate(words):
+                time.sleep(config.token_latency_ms / 1000)
+                delta = {"role": "assistant", "content": word} if i == 0 else {"content": f" {word}"}
+                self._write_event({**base, "object": "chat.completion.chunk", "choices": [{"index": 0, "delta": delta, "finish_reason": None}]})
+            self._write_event({**base, "object": "chat.completion.chunk", "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+            if (request.get("stream_options") or {}).get("include_usage"):
+                usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(words), "total_tokens": prompt_tokens + len(words)}
+                self._write_event({**base, "object": "chat.completion.chunk", "choices": [], "usage": usage})
+            self._write_chunk(b"data: [DONE]\n\n")
+            self._write_chunk(b"")
+
+        def _write_event(self, body):
+            self._write_chunk(f"data: {json.dumps(body)}\n\n".encode("utf-8"))
+
+        def _write_chunk(self, data):
+            self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+            self.wfile.flush()
+
+    return Handler
+
+
+def start_fake_openai(config=None, host="127.0.0.1", port=0):
+    config = config or FakeOpenAIConfig()
+    server = ThreadingHTTPServer((host, port), make_handler(config))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://{host}:{server.server_address[1]}/v1"
+    return server, base_url, config
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a fake OpenAI API for local benchmarks.")
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--token-latency-ms", type=float, default=2.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 429")
+    args = parser.parse_args()
+
+    config = FakeOpenAIConfig(args.latency_ms, args.token_latency_ms, args.error_rate)
+    server, base_url, _ = start_fake_openai(config, port=args.port)
+    print(f"Fake OpenAI listening on {base_url}; set OPENAI_BASE_URL to use it")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
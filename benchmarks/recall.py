@@ -0,0 +1,216 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import uuid
+
+import numpy as np
+
+from benchmarks.run_benchmarks import QUESTIONS, latency_stats, git_commit
+from config import (
+    CHUNK_SIZE,
+    CHUNK_OVERLAP,
+    EMBEDDING_MODEL,
+    EMBEDDING_SIZE,
+    QUANTIZATION_OVERSAMPLING,
+    BINARY_QUANTIZATION_OVERSAMPLING,
+    HNSW_M,
+    HNSW_EF_CONSTRUCT,
+    HNSW_EF_SEARCH,
+)
+
+# Recall@k of reduced-dimension and quantized indexes against exact full-dimension search,
+# with query latency and resident index size for each layout.
+#
+#   python -m benchmarks.recall --output recall.json
+#   python -m benchmarks.recall --source openai --pdf-folder pdf --dims 1536 512 256
+#   python -m benchmarks.recall --qdrant-url http://localhost:6333
+#
+# text-embedding-3 vectors requested with `dimensions=d` equal the full vectors cut to their first
+# d components and renormalized, so every layout is evaluated from one set of full-size embeddings.
+
+
+def synthetic_corpus(documents, queries, dim, clusters=64, seed=0):
+    # Clustered vectors whose variance falls off along the dimensions, like text-embedding-3's,
+    # so cutting dimensions loses detail gradually instead of at random
+    rng = np.random.default_rng(seed)
+    decay = (1.0 + np.arange(dim) / 64.0) ** -0.5
+    centers = rng.standard_normal((clusters, dim)) * decay
+    labels = rng.integers(0, clusters, documents)
+    vectors = centers[labels] + 0.6 * rng.standard_normal((documents, dim)) * decay
+    picks = rng.integers(0, documents, queries)
+    query_vectors = vectors[picks] + 0.4 * rng.standard_normal((queries, dim)) * decay
+    return vectors.astype(np.float32), query_vectors.astype(np.float32)
+
+
+def manual_corpus(pdf_folder, queries, seed=0):
+    # Real chunks and questions embedded once at full size; the embedding cache makes reruns free
+    from langchain_openai import OpenAIEmbeddings
+    from embedding_cache import get_embedding_cache, CachedEmbeddings
+    from ingest_pipeline import split_pdf
+
+    texts = []
+    for file_name in sorted(name for name in os.listdir(pdf_folder) if name.endswith(".pdf")):
+        texts.extend(doc.page_content for doc in split_pdf(os.path.join(pdf_folder, file_name), CHUNK_SIZE, CHUNK_OVERLAP))
+    if not texts:
+        raise SystemExit(f"No PDF chunks found in {pdf_folder}")
+    rng = np.random.default_rng(seed)
+    # Besides the fixed questions, the opening of random chunks stands in for what users ask
+    openings = [texts[i][:200] for i in rng.integers(0, len(texts), max(0, queries - len(QUESTIONS)))]
+    embeddings = CachedEmbeddings(OpenAIEmbeddings(model=EMBEDDING_MODEL), get_embedding_cache(), EMBEDDING_MODEL)
+    vectors = embeddings.embed_documents(texts)
+    query_vectors = embeddings.embed_documents((QUESTIONS + openings)[:queries])
+    return np.asarray(vectors, dtype=np.float32), np.asarray(query_vectors, dtype=np.float32)
+
+
+def truncate(vectors, dim):
+    vectors = vectors[:, :dim]
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def exact_neighbors(vectors, query_vectors, k):
+    scores = truncate(query_vectors, vectors.shape[1]) @ truncate(vectors, vectors.shape[1]).T
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def recall_at_k(found, exact):
+    return float(np.mean([len(set(f) & set(e)) / len(e) for f, e in zip(found, exact)]))
+
+
+def point_ids(count):
+    return [str(uuid.UUID(int=i)) for i in range(count)]
+
+
+def row_of(doc):
+    return uuid.UUID(str(doc.id or doc.metadata.get("_id"))).int
+
+
+def time_queries(search, query_vectors):
+    found, samples = [], []
+    for vector in query_vectors[:5]:
+        search(vector)
+    for vector in query_vectors:
+        start = time.perf_counter()
+        docs = search(vector)
+        samples.append((time.perf_counter() - start) * 1000)
+        found.append([row_of(doc) for doc in docs])
+    return found, samples
+
+
+def bench_local(vectors, query_vectors, exact, dim, quantization, rescore, k, oversampling, index_dir):
+    from local_vector_store import LocalVectorStore
+
+    path = os.path.join(index_dir, f"{dim}_{quantization}")
+    if not os.path.exists(path):
+        store = LocalVectorStore(path, dim=dim, quantization=quantization, oversampling=oversampling)
+        ids = point_ids(len(vectors))
+        for start in range(0, len(vectors), 1000):
+            block = truncate(vectors[start:start + 1000], dim)
+            store.add_embeddings([""] * len(block), block, None, ids[start:start + 1000])
+    else:
+        store = LocalVectorStore(path, oversampling=oversampling)
+    queries = truncate(query_vectors, dim)
+    found, samples = time_queries(lambda vector: store.similarity_search_by_vector(vector, k=k, rescore=rescore), queries)
+    return dict(latency_stats(samples), recall=recall_at_k(found, exact), memory_bytes=store.memory_bytes())
+
+
+def bench_qdrant(client, vectors, query_vectors, exact, dim, quantization, rescore, k, oversampling):
+    from langchain_core.documents import Document
+    from vector_backends import QdrantBackend
+
+    backend = QdrantBackend(client, quantization, rescore, oversampling, HNSW_M, HNSW_EF_CONSTRUCT, HNSW_EF_SEARCH)
+    collection_name = f"recall_{dim}_{quantization}"
+    if not backend.collection_exists(collection_name):
+        backend.create_collection(collection_name, dim)
+        ids = point_ids(len(vectors))
+        for start in range(0, len(vectors), 500):
+            block = truncate(vectors[start:start + 500], dim)
+            backend.upsert(collection_name, ids[start:start + 500], block.tolist(), [Document(page_content="")] * len(block))
+    search_params = backend.search_kwargs()["search_params"]
+
+    def search(vector):
+        points = client.query_points(collection_name, query=vector.tolist(), limit=k, search_params=search_params).points
+        return [Document(page_content="", id=str(point.id)) for point in points]
+
+    found, samples = time_queries(search, truncate(query_vectors, dim))
+    # Qdrant keeps quantized codes in RAM and the originals on disk; report the code size for comparison
+    memory = len(vectors) * dim * {"none": 4, "scalar": 1, "binary": 1 / 8}[quantization]
+    return dict(latency_stats(samples), recall=recall_at_k(found, exact), memory_bytes=int(memory))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure recall@k of reduced and quantized vector indexes.")
+    parser.add_argument("--source", choices=["synthetic", "openai"], default="synthetic")
+    parser.add_argument("--pdf-folder", default="pdf")
+    parser.add_argument("--documents", type=int, default=20000, help="Synthetic corpus size")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dims", type=int, nargs="+", default=[EMBEDDING_SIZE, 512, 256])
+    parser.add_argument("--quantizations", nargs="+", choices=["none", "scalar", "binary"], default=["none", "scalar", "binary"])
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--oversampling", type=float, default=QUANTIZATION_OVERSAMPLING)
+    parser.add_argument("--binary-oversampling", type=float, default=BINARY_QUANTIZATION_OVERSAMPLING)
+    parser.add_argument("--qdrant-url", help="Also measure a Qdrant server; local mode ignores quantization and HNSW")
+    parser.add_argument("--output", default="recall_results.json")
+    args = parser.parse_args()
+
+    if args.source == "openai":
+        vectors, query_vectors = manual_corpus(args.pdf_folder, args.queries)
+    else:
+        vectors, query_vectors = synthetic_corpus(args.documents, args.queries, EMBEDDING_SIZE)
+    exact = exact_neighbors(vectors, query_vectors, args.k)
+
+    backends = ["local"]
+    client = None
+    if args.qdrant_url:
+        from qdrant_client import QdrantClient
+
+        client = QdrantClient(url=args.qdrant_url, timeout=60)
+        backends.append("qdrant")
+
+    results = []
+    with tempfile.TemporaryDirectory() as index_dir:
+        for backend in backends:
+            for dim in args.dims:
+                for quantization in args.quantizations:
+                    # Binary is only offered with rescoring, from its own larger shortlist (see config.py)
+                    rescores = {"none": [None], "scalar": [True, False], "binary": [True]}[quantization]
+                    oversampling = args.binary_oversampling if quantization == "binary" else args.oversampling
+                    for rescore in rescores:
+                        if backend == "local":
+                            row = bench_local(
+                                vectors, query_vectors, exact, dim, quantization, rescore, args.k, oversampling, index_dir
+                            )
+                        else:
+                            row = bench_qdrant(
+                                client, vectors, query_vectors, exact, dim, quantization, rescore is not False, args.k, oversampling
+                            )
+                        row.update(
+                            backend=backend, dimensions=dim, quantization=quantization, rescore=rescore, oversampling=oversampling
+                        )
+                        results.append(row)
+                        print(
+                            f"{backend:7} {dim:5d} {quantization:7} {str(rescore):5} recall@{args.k}={row['recall']:.3f} "
+                            f"p50={row['p50_ms']:.2f}ms p99={row['p99_ms']:.2f}ms memory={row['memory_bytes'] / 1024:.0f}KiB"
+                        )
+        if client is not None:
+            for dim in args.dims:
+                for quantization in args.quantizations:
+                    client.delete_collection(f"recall_{dim}_{quantization}")
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": sys.version.split()[0],
+        "config": vars(args),
+        "documents": len(vectors),
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
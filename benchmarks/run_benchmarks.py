@@ -0,0 +1,308 @@
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from io import BytesIO
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from benchmarks.fake_openai import FakeOpenAIConfig, fake_embedding, start_fake_openai
+from config import CHUNK_SIZE, CHUNK_OVERLAP, INGEST_BATCH_SIZE, EMBEDDING_MODEL, EMBEDDING_SIZE
+
+# Reproducible performance suite run against local stand-ins (fake OpenAI server, local or
+# in-memory Qdrant vector store). Writes a JSON report that --compare checks against a baseline.
+#
+#   python -m benchmarks.run_benchmarks --output bench.json
+#   python -m benchmarks.run_benchmarks --output new.json --compare bench.json
+
+# Metrics where a larger value is better; every other metric is a latency or size
+HIGHER_IS_BETTER = {"ingestion.chunks_per_sec"}
+
+QUESTIONS = [
+    "How do I fix a leaking pipe under the sink?",
+    "What does error code E21 mean on my dishwasher?",
+    "How often should I replace the furnace filter?",
+    "My washing machine is making a grinding noise",
+    "How do I get rid of ants in the kitchen?",
+    "How do I clean my gutters safely?",
+    "The fridge is not cooling but the light is on",
+    "What temperature should the water heater be set to?",
+]
+
+
+def latency_stats(samples_ms):
+    samples = np.asarray(samples_ms, dtype=np.float64)
+    return {
+        "p50_ms": float(np.percentile(samples, 50)),
+        "p99_ms": float(np.percentile(samples, 99)),
+        "mean_ms": float(samples.mean()),
+    }
+
+
+def peak_rss_mb():
+    # ru_maxrss is in KiB on Linux; children covers the ingestion process pool
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    return {"self": own, "children": children}
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return None
+
+
+def make_backend(kind, index_dir):
+    if kind == "local":
+        from vector_backends import LocalBackend
+
+        return LocalBackend(index_dir)
+    from qdrant_client import QdrantClient
+    from vector_backends import QdrantBackend
+
+    return QdrantBackend(QdrantClient(":memory:"))
+
+
+def bench_ingestion(pdf_folder, base_url, backend, collection_name, embed_concurrency, upsert_concurrency):
+    from openai import AsyncOpenAI
+    from ingest_manifest import assign_chunk_ids
+    from ingest_pipeline import IngestJob, embed_texts, run_ingestion
+    from rate_limit import TokenBucket
+
+    backend.create_collection(collection_name, EMBEDDING_SIZE)
+    openai_client = AsyncOpenAI(base_url=base_url, api_key="benchmark")
+    scheduler = TokenBucket(1000000, 3000)
+    pdf_files = sorted(name for name in os.listdir(pdf_folder) if name.endswith(".pdf"))
+    jobs = [IngestJob(name, os.path.join(pdf_folder, name), None, None) for name in pdf_files]
+    stored = {"chunks": 0}
+
+    def prepare_job(job, documents):
+        chunks = assign_chunk_ids(job.file_name, documents, job.occurrences)
+        job.chunks.update(chunks)
+        return list(chunks)
+
+    def embed_batch(texts):
+        return embed_texts(openai_client, EMBEDDING_MODEL, texts, scheduler)
+
+    async def upsert_batch(point_ids, vectors, documents):
+        await asyncio.to_thread(backend.upsert, collection_name, point_ids, vectors, documents)
+        stored["chunks"] += len(point_ids)
+
+    start = time.perf_counter()
+    asyncio.run(run_ingestion(
+        jobs,
+        prepare_job,
+        embed_batch,
+        upsert_batch,
+        scheduler,
+        lambda job: None,
+        chunk_size=CHUNK_SIZE,
+        chunk_overlap=CHUNK_OVERLAP,
+        max_batch_size=INGEST_BATCH_SIZE,
+        embed_concurrency=embed_concurrency,
+        upsert_concurrency=upsert_concurrency,
+        log=lambda message: None,
+    ))
+    seconds = time.perf_counter() - start
+    errors = [f"{job.file_name}: {job.error}" for job in jobs if job.error is not None]
+    return {
+        "files": len(jobs),
+        "chunks": stored["chunks"],
+        "seconds": seconds,
+        "chunks_per_sec": stored["chunks"] / seconds if seconds else 0.0,
+        "errors": errors,
+    }
+
+
+class FakeEmbeddings(Embeddings):
+    # Same vectors as the fake server, computed locally so retrieval timing excludes HTTP
+    def embed_documents(self, texts):
+        return [fake_embedding(text, EMBEDDING_SIZE) for text in texts]
+
+    def embed_query(self, text):
+        return fake_embedding(text, EMBEDDING_SIZE)
+
+
+def bench_retrieval(backend, collection_name, queries, k):
+    store = backend.vector_store(collection_name, FakeEmbeddings())
+    vectors = [fake_embedding(query, EMBEDDING_SIZE) for query in queries]
+    for vector in vectors[:5]:
+        store.similarity_search_by_vector(vector, k=k)
+    samples = []
+    for vector in vectors:
+        start = time.perf_counter()
+        store.similarity_search_by_vector(vector, k=k)
+        samples.append((time.perf_counter() - start) * 1000)
+    return dict(latency_stats(samples), queries=len(queries), k=k)
+
+
+def bench_chat(base_url, requests):
+    from openai import OpenAI
+    from chat_with_gpt import chat_with_gpt, stream_chat_with_gpt
+    from chatbot_types import CHATBOT_TYPES
+
+    client = OpenAI(base_url=base_url, api_key="benchmark")
+    bot_types = list(CHATBOT_TYPES)
+    end_to_end, first_token, errors = [], [], 0
+    for i in range(requests):
+        prompt = QUESTIONS[i % len(QUESTIONS)]
+        bot_type = bot_types[i % len(bot_types)]
+        start = time.perf_counter()
+        answer = chat_with_gpt(client, prompt, [], bot_type=bot_type)
+        end_to_end.append((time.perf_counter() - start) * 1000)
+        errors += answer.startswith("An error occurred")
+
+        start = time.perf_counter()
+        stream = stream_chat_with_gpt(client, prompt, [], bot_type=bot_type)
+        next(stream)
+        first_token.append((time.perf_counter() - start) * 1000)
+        for _ in stream:
+            pass
+    return {
+        "end_to_end": latency_stats(end_to_end),
+        "time_to_first_token": latency_stats(first_token),
+        "requests": requests,
+        "errors": errors,
+    }
+
+
+def synthetic_photo(width=4032, height=3024, seed=0):
+    # Noise compresses poorly, so the upload is about as heavy as a real phone photo
+    from PIL import Image
+
+    pixels = np.random.default_rng(seed).integers(0, 256, (height // 8, width // 8, 3), dtype=np.uint8)
+    image = Image.fromarray(pixels).resize((width, height))
+    buffered = BytesIO()
+    image.save(buffered, format="JPEG", quality=95)
+    return buffered.getvalue()
+
+
+def bench_vision(base_url, requests):
+    import base64
+    from openai import OpenAI
+    from image_processing import preprocess_image
+
+    client = OpenAI(base_url=base_url, api_key="benchmark")
+    photo = synthetic_photo()
+    preprocess, end_to_end = [], []
+    payload_bytes = 0
+    for _ in range(requests):
+        start = time.perf_counter()
+        image_bytes, mime_type = preprocess_image(photo)
+        preprocess.append((time.perf_counter() - start) * 1000)
+        payload_bytes = len(image_bytes)
+        client.chat.completions.create(
+            model="gpt-4o",
+            messages=[{"role": "user", "content": [
+                {"type": "text", "text": "Please analyze this image."},
+                {"type": "image_url", "image_url": {"url": f"data:{mime_type};base64,{base64.b64encode(image_bytes).decode()}"}},
+            ]}],
+            max_tokens=500,
+        )
+        end_to_end.append((time.perf_counter() - start) * 1000)
+    return {
+        "preprocess": latency_stats(preprocess),
+        "end_to_end": latency_stats(end_to_end),
+        "upload_bytes": len(photo),
+        "payload_bytes": payload_bytes,
+        "requests": requests,
+    }
+
+
+def flatten(metrics, prefix=""):
+    flat = {}
+    for key, value in metrics.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{name}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare(current, baseline, tolerance):
+    current_flat, baseline_flat = flatten(current["metrics"]), flatten(baseline["metrics"])
+    regressions = []
+    print(f"{'metric':50} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name in sorted(set(current_flat) & set(baseline_flat)):
+        before, after = baseline_flat[name], current_flat[name]
+        change = (after - before) / before if before else 0.0
+        worse = -change if name in HIGHER_IS_BETTER else change
+        # Only latencies, throughput and memory are judged; counts are informational
+        judged = name in HIGHER_IS_BETTER or name.endswith("_ms") or name.startswith("peak_rss_mb")
+        flag = " REGRESSION" if judged and worse > tolerance else ""
+        if flag:
+            regressions.append(name)
+        print(f"{name:50} {before:12.3f} {after:12.3f} {change:+8.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the performance benchmarks against local stand-ins.")
+    parser.add_argument("--pdf-folder", default="pdf")
+    parser.add_argument("--backend", choices=["local", "qdrant-memory"], default="local")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare", help="Baseline JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Allowed relative slowdown before failing")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="Fake OpenAI base latency per request")
+    parser.add_argument("--token-latency-ms", type=float, default=2.0, help="Fake OpenAI latency per generated token")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of fake OpenAI requests that return 429")
+    parser.add_argument("--chat-requests", type=int, default=20)
+    parser.add_argument("--vision-requests", type=int, default=5)
+    parser.add_argument("--retrieval-queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--embed-concurrency", type=int, default=4)
+    parser.add_argument("--upsert-concurrency", type=int, default=2)
+    args = parser.parse_args()
+
+    fake_config = FakeOpenAIConfig(args.latency_ms, args.token_latency_ms, args.error_rate)
+    server, base_url, fake_config = start_fake_openai(fake_config)
+    os.environ["OPENAI_BASE_URL"] = base_url
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+    try:
+        with tempfile.TemporaryDirectory() as index_dir:
+            backend = make_backend(args.backend, index_dir)
+            collection_name = "benchmark"
+            metrics = {}
+            metrics["ingestion"] = bench_ingestion(
+                args.pdf_folder, base_url, backend, collection_name, args.embed_concurrency, args.upsert_concurrency
+            )
+            queries = [f"{QUESTIONS[i % len(QUESTIONS)]} #{i}" for i in range(args.retrieval_queries)]
+            metrics["retrieval"] = bench_retrieval(backend, collection_name, queries, args.k)
+            metrics["chat"] = bench_chat(base_url, args.chat_requests)
+            metrics["vision"] = bench_vision(base_url, args.vision_requests)
+            metrics["peak_rss_mb"] = peak_rss_mb()
+            metrics["fake_openai"] = dict(fake_config.counters)
+    finally:
+        server.shutdown()
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": sys.version.split()[0],
+        "config": vars(args),
+        "metrics": metrics,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {args.output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} metric(s) regressed by more than {args.tolerance:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,14 @@
 
+import logging
+import time
+
 from chatbot_types import CHATBOT_TYPES
-from config import MAX_HISTORY,MAX_TOKENS
+from config import MAX_TOKENS, CONTEXT_TOKEN_BUDGET, RETRIEVAL_TOKEN_BUDGET, SUMMARY_MAX_TOKENS
+from answer_cache import is_context_free
+from context_builder import build_context, fit_history, strip_pending_prompt, truncate_tokens, count_tokens
+from instrumentation import METRICS
 
+logger = logging.getLogger(__name__)
 
 
 def get_system_prompt(bot_type):
@@ -11,39 +18,188 @@ def get_assistant_prompt(bot_type):
     return CHATBOT_TYPES[bot_type]["assistant_prompt"]
 
 
-def chat_with_gpt(client, prompt, conversation_history, pdf_chain=None, bot_type=None):
+def lookup_cached_answer(answer_cache, prompt, conversation_history, pdf_chain=None, bot_type=None):
+    """Shared answer-cache handling for the blocking and streaming paths.
+
+    Returns `(cache_namespace, cached_answer, store)`; `cached_answer` is None on
+    a miss, and `store(answer)` records a fresh answer when it may be cached.
+    """
+    cache_namespace = (bot_type, "pdf" if pdf_chain else "general")
+    # Only context-free questions are cached; follow-ups depend on the conversation so far
+    if answer_cache is None or not is_context_free(prompt, conversation_history):
+        return cache_namespace, None, lambda answer: None
+    cached_answer, query_vector = answer_cache.lookup(cache_namespace, prompt)
+
+    def store(answer):
+        if answer:
+            answer_cache.store(cache_namespace, prompt, answer, query_vector)
+    return cache_namespace, cached_answer, store
+
+
+def chat_with_gpt(client, prompt, conversation_history, pdf_chain=None, bot_type=None, answer_cache=None, summary=None):
     if not client:
         return "OpenAI client is not initialized. Please check your API key in the .env file."
-    
+
+    cache_namespace, cached_answer, store_answer = lookup_cached_answer(
+        answer_cache, prompt, conversation_history, pdf_chain, bot_type
+    )
+    if cached_answer is not None:
+        return cached_answer
+
     try:
-        system_prompt = get_system_prompt(bot_type)
-        assistant_prompt = get_assistant_prompt(bot_type)
-        
-        if pdf_chain:
-            system_prompt += " Use the information from the uploaded PDF to provide detailed and accurate answers. If the PDF doesn't contain relevant information for a question, use your general knowledge but mention that the information is not from the PDF."
-            chain_history = [(msg["content"], "") for msg in conversation_history[-MAX_HISTORY:] if msg["role"] == "user"]
-            response = pdf_chain.invoke({
-                "question": prompt,
-                "chat_history": chain_history,
-                "system_prompt": system_prompt,
-                "assistant_prompt": assistant_prompt
-            })
-            return response["answer"][:MAX_TOKENS]
+        with METRICS.span("chat", bot_type=bot_type, source=cache_namespace[1]):
+            answer = generate_answer(client, prompt, conversation_history, pdf_chain, bot_type, summary)
+    except Exception as e:
+        logger.exception("Chat request failed for %s", bot_type)
+        return f"An error occurred: {str(e)}"
+
+    store_answer(answer)
+    return answer
+
+
+def stream_chat_with_gpt(client, prompt, conversation_history, pdf_chain=None, bot_type=None, answer_cache=None, summary=None):
+    # Generator variant of chat_with_gpt: yields text pieces as they arrive
+    if not client:
+        yield "OpenAI client is not initialized. Please check your API key in the .env file."
+        return
+
+    cache_namespace, cached_answer, store_answer = lookup_cached_answer(
+        answer_cache, prompt, conversation_history, pdf_chain, bot_type
+    )
+    if cached_answer is not None:
+        yield cached_answer
+        return
+
+    pieces = []
+    try:
+        with METRICS.span("chat", bot_type=bot_type, source=cache_namespace[1]):
+            for piece in stream_answer(client, prompt, conversation_history, pdf_chain, bot_type, summary):
+                pieces.append(piece)
+                yield piece
+    except Exception as e:
+        logger.exception("Streaming chat request failed for %s", bot_type)
+        yield f"An error occurred: {str(e)}"
+        return
+
+    store_answer("".join(pieces).strip())
+
+
+def make_summarizer(client, bot_type=None):
+    def summarize(previous_summary, messages):
+        transcript = "\n".join(f"{message['role']}: {message['content']}" for message in messages)
+        with METRICS.span("history_summary", bot_type=bot_type):
+            response = client.chat.completions.create(
+                model="gpt-4o-mini",
+                messages=[
+                    {"role": "system", "content": "You maintain a running summary of a home maintenance support chat. Merge the new turns into the existing summary. Keep problems described, steps already tried, appliance models and advice given. Reply with the updated summary only."},
+                    {"role": "user", "content": f"Existing summary:\n{previous_summary or '(none)'}\n\nNew turns:\n{transcript}"}
+                ],
+                max_tokens=SUMMARY_MAX_TOKENS
+            )
+        METRICS.record_usage(response.usage, "gpt-4o-mini", bot_type)
+        return response.choices[0].message.content.strip()
+    return summarize
+
+
+def build_chain_inputs(client, prompt, conversation_history, bot_type, summary=None):
+    system_prompt = get_system_prompt(bot_type)
+    system_prompt += " Use the information from the uploaded PDF to provide detailed and accurate answers. If the PDF doesn't contain relevant information for a question, use your general knowledge but mention that the information is not from the PDF."
+    assistant_prompt = get_assistant_prompt(bot_type)
+
+    # The chain retrieves its own excerpts, so leave room for them in the history budget
+    fixed = count_tokens(system_prompt) + count_tokens(assistant_prompt) + count_tokens(prompt) + RETRIEVAL_TOKEN_BUDGET
+    history = strip_pending_prompt(prompt, conversation_history)
+    kept, summary = fit_history(history, max(0, CONTEXT_TOKEN_BUDGET - fixed), summary, make_summarizer(client, bot_type))
+
+    chain_history = []
+    pending_question = None
+    for msg in kept:
+        if msg["role"] == "user":
+            if pending_question is not None:
+                chain_history.append((pending_question, ""))
+            pending_question = msg["content"]
         else:
-            messages = [
-                {"role": "system", "content": system_prompt},
-                {"role": "assistant", "content": assistant_prompt}
-            ]
-            
-            recent_history = conversation_history[-MAX_HISTORY:]
-            messages.extend(recent_history)
-            messages.append({"role": "user", "content": prompt})
-            
+            chain_history.append((pending_question or "", msg["content"]))
+            pending_question = None
+    if pending_question is not None:
+        chain_history.append((pending_question, ""))
+
+    return {
+        "question": prompt,
+        "chat_history": chain_history,
+        "system_prompt": system_prompt,
+        "assistant_prompt": assistant_prompt,
+        # Sent as its own message after the fixed prefix, so the system prompt stays cacheable
+        "summary": summary["text"],
+        "bot_type": bot_type
+    }
+
+
+def build_messages(client, prompt, conversation_history, bot_type, summary=None):
+    return build_context(
+        get_system_prompt(bot_type),
+        get_assistant_prompt(bot_type),
+        conversation_history,
+        prompt,
+        CONTEXT_TOKEN_BUDGET,
+        summary=summary,
+        summarize=make_summarizer(client, bot_type),
+    )
+
+
+def generate_answer(client, prompt, conversation_history, pdf_chain=None, bot_type=None, summary=None):
+    if pdf_chain:
+        with METRICS.span("prompt_assembly", bot_type=bot_type):
+            inputs = build_chain_inputs(client, prompt, conversation_history, bot_type, summary)
+        with METRICS.span("pdf_chain", bot_type=bot_type):
+            response = pdf_chain.invoke(inputs)
+        return truncate_tokens(response["answer"], MAX_TOKENS)
+    else:
+        with METRICS.span("prompt_assembly", bot_type=bot_type):
+            messages = build_messages(client, prompt, conversation_history, bot_type, summary)
+        with METRICS.span("llm", model="gpt-4o-mini", bot_type=bot_type):
             response = client.chat.completions.create(
                 model="gpt-4o-mini",
                 messages=messages,
                 max_tokens=MAX_TOKENS
             )
-            return response.choices[0].message.content.strip()
-    except Exception as e:
-        return f"An error occurred: {str(e)}"
\ No newline at end of file
+        METRICS.record_usage(response.usage, "gpt-4o-mini", bot_type)
+        return response.choices[0].message.content.strip()
+
+
+def stream_answer(client, prompt, conversation_history, pdf_chain=None, bot_type=None, summary=None):
+    if pdf_chain:
+        with METRICS.span("prompt_assembly", bot_type=bot_type):
+            inputs = build_chain_inputs(client, prompt, conversation_history, bot_type, summary)
+        # Chains stream partial dicts; only the "answer" key carries generated text
+        remaining = MAX_TOKENS
+        with METRICS.span("pdf_chain", bot_type=bot_type):
+            for chunk in pdf_chain.stream(inputs):
+                piece = chunk.get("answer") if isinstance(chunk, dict) else None
+                if not piece or remaining <= 0:
+                    continue
+                piece = truncate_tokens(piece, remaining)
+                remaining -= count_tokens(piece)
+                yield piece
+    else:
+        with METRICS.span("prompt_assembly", bot_type=bot_type):
+            messages = build_messages(client, prompt, conversation_history, bot_type, summary)
+        start = time.perf_counter()
+        first_token = True
+        with METRICS.span("llm", model="gpt-4o-mini", bot_type=bot_type):
+            stream = client.chat.completions.create(
+                model="gpt-4o-mini",
+                messages=messages,
+                max_tokens=MAX_TOKENS,
+                stream=True,
+                stream_options={"include_usage": True}
+            )
+            for chunk in stream:
+                # With include_usage the final chunk has no choices, only token counts
+                if chunk.usage is not None:
+                    METRICS.record_usage(chunk.usage, "gpt-4o-mini", bot_type)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    if first_token:
+                        METRICS.observe("llm_first_token_seconds", time.perf_counter() - start, model="gpt-4o-mini", bot_type=bot_type)
+                        first_token = False
+                    yield chunk.choices[0].delta.content
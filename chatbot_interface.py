@@ -1,21 +1,90 @@
 import streamlit as st
 import os
-from chat_with_gpt import chat_with_gpt
-from langchain_community.chat_models import ChatOpenAI
-from config import MAX_HISTORY, MAX_MESSAGES
-from PIL import Image
+import logging
+import functools
+import time
+from contextlib import nullcontext
+from chat_with_gpt import stream_chat_with_gpt
+from config import (
+    MAX_HISTORY,
+    MAX_MESSAGES,
+    EMBEDDING_MODEL,
+    ANSWER_CACHE_SIMILARITY_THRESHOLD,
+    ANSWER_CACHE_THRESHOLDS,
+    ANSWER_CACHE_TTL_SECONDS,
+    ANSWER_CACHE_MAX_ENTRIES,
+    IMAGE_ANALYSIS_CACHE_ENTRIES,
+    IMAGE_ANALYSIS_CACHE_TTL_SECONDS,
+    SHOW_DEBUG_METRICS,
+    CONVERSATION_WINDOW,
+    PDF_FOLDER,
+    MANUAL_CHAIN_RETRY_SECONDS,
+)
 import base64
-from openai import OpenAI
+from openai_gateway import get_openai_gateway
+from answer_cache import AnswerCache
+from context_builder import new_summary
+from chatbot_types import CHATBOT_TYPES
+from conversation_store import get_conversation_store, load_window, trim_window, stored_summary
+from image_processing import image_sha256, preprocess_image
+from instrumentation import METRICS
+
+logger = logging.getLogger(__name__)
 
 @st.cache_resource
 def get_openai_client():
     api_key = os.getenv("OPENAI_API_KEY")
     if api_key:
-        return OpenAI(api_key=api_key)
+        return get_openai_gateway()
     return None
 
-def encode_image_to_base64(image_file):
-    return base64.b64encode(image_file.getvalue()).decode('utf-8')
+# Process-wide like st.cache_resource, but lru_cache can tell whether it was built yet
+@functools.lru_cache(maxsize=None)
+def get_answer_cache():
+    # LangChain is only loaded once the first question is asked
+    from langchain_openai import OpenAIEmbeddings
+    from embedding_cache import get_embedding_cache, CachedEmbeddings
+
+    # Shared across sessions so one user's answer can serve another's identical question
+    embeddings = CachedEmbeddings(OpenAIEmbeddings(model=EMBEDDING_MODEL), get_embedding_cache(), EMBEDDING_MODEL)
+    return AnswerCache(
+        embeddings.embed_query,
+        ANSWER_CACHE_SIMILARITY_THRESHOLD,
+        ANSWER_CACHE_TTL_SECONDS,
+        ANSWER_CACHE_MAX_ENTRIES,
+        thresholds=ANSWER_CACHE_THRESHOLDS,
+    )
+
+# Process-wide, like the cached chain itself; also remembers when loading the manuals last failed
+MANUAL_CHAIN = {"chain": None, "failed_at": None}
+
+def get_manual_chain():
+    # Ingests the folder on first use, so the retrieval stack is only loaded when manuals are configured
+    if not PDF_FOLDER or MANUAL_CHAIN["chain"] is not None:
+        return MANUAL_CHAIN["chain"]
+    failed_at = MANUAL_CHAIN["failed_at"]
+    if failed_at is not None and time.monotonic() - failed_at < MANUAL_CHAIN_RETRY_SECONDS:
+        return None
+    from process_pdf import get_pdf_chain
+
+    try:
+        # Ingestion logs collapse into the status box instead of filling the page
+        with st.status("Loading the manuals...", expanded=False) as status:
+            chain = get_pdf_chain(PDF_FOLDER)
+            status.update(label="Manuals loaded", state="complete")
+    except Exception:
+        logger.exception("Loading the manuals from %s failed", PDF_FOLDER)
+        MANUAL_CHAIN["failed_at"] = time.monotonic()
+        st.warning("The manuals could not be loaded; answers will not draw on them for now.")
+        return None
+    MANUAL_CHAIN.update(chain=chain, failed_at=None)
+    return chain
+
+def answer_cache_loaded():
+    return get_answer_cache.cache_info().currsize > 0
+
+def encode_image_to_base64(image_bytes):
+    return base64.b64encode(image_bytes).decode('utf-8')
 
 def get_image_prompt_and_triggers(bot_type):
     bot_configs = {
@@ -37,12 +106,18 @@ def get_image_prompt_and_triggers(bot_type):
     }
     return bot_configs.get(bot_type, {"prompt": "Please analyze this image and provide relevant recommendations."})
 
-def analyze_image_with_openai(image, bot_type):
+# Keyed by the upload's content hash and bot type; the underscore arguments are not hashed by Streamlit.
+# Errors propagate out of here so they are never cached.
+@st.cache_data(show_spinner=False, max_entries=IMAGE_ANALYSIS_CACHE_ENTRIES, ttl=IMAGE_ANALYSIS_CACHE_TTL_SECONDS)
+def analyze_image_cached(image_hash, bot_type, _image_bytes):
     client = get_openai_client()
-    try:
-        base64_image = encode_image_to_base64(image)
-        bot_config = get_image_prompt_and_triggers(bot_type)
-        
+    METRICS.inc("image_analysis_api_calls_total", bot_type=bot_type)
+    with METRICS.span("image_preprocess", bot_type=bot_type):
+        image_bytes, mime_type = preprocess_image(_image_bytes)
+        base64_image = encode_image_to_base64(image_bytes)
+    bot_config = get_image_prompt_and_triggers(bot_type)
+
+    with METRICS.span("llm", model="gpt-4o", bot_type=bot_type):
         response = client.chat.completions.create(
             model="gpt-4o",
             messages=[
@@ -56,7 +131,7 @@ def analyze_image_with_openai(image, bot_type):
                         {
                             "type": "image_url",
                             "image_url": {
-                                "url": f"data:image/jpeg;base64,{base64_image}"
+                                "url": f"data:{mime_type};base64,{base64_image}"
                             }
                         }
                     ]
@@ -64,22 +139,64 @@ def analyze_image_with_openai(image, bot_type):
             ],
             max_tokens=500
         )
-        
-        return response.choices[0].message.content
+    METRICS.record_usage(response.usage, "gpt-4o", bot_type)
+
+    return response.choices[0].message.content
+
+def analyze_image_with_openai(image, bot_type):
+    METRICS.inc("image_analysis_requests_total", bot_type=bot_type)
+    try:
+        image_bytes = image.getvalue()
+        with METRICS.span("vision", bot_type=bot_type):
+            return analyze_image_cached(image_sha256(image_bytes), bot_type, image_bytes)
     except Exception as e:
+        logger.exception("Image analysis failed for %s", bot_type)
         return f"Error analyzing image: {str(e)}"
 
-def chatbot_interface(bot_type):
+def start_session(bot_type):
+    session_id = get_conversation_store().create_session(bot_type)
+    st.session_state.session_id = session_id
+    st.session_state.messages = []
+    st.session_state.window_start = 0
+    st.session_state.history_summary = new_summary()
+    st.session_state.image_analyzed = False
+    # Keeping the id in the URL lets a reload or a bookmarked link resume the conversation
+    st.query_params["session"] = session_id
+
+def resume_session(session_id):
+    store = get_conversation_store()
+    session = store.get_session(session_id)
+    if session is None or session["bot_type"] not in CHATBOT_TYPES:
+        return False
+    messages, start, summary = load_window(store, session_id, CONVERSATION_WINDOW)
+    st.session_state.session_id = session_id
+    st.session_state.selected_bot = session["bot_type"]
+    st.session_state.messages = messages
+    st.session_state.window_start = start
+    st.session_state.history_summary = summary
+    st.session_state.image_analyzed = False
+    return True
+
+def record_message(role, content):
+    # Every message goes to the store; session state only keeps the recent window
+    get_conversation_store().append_message(st.session_state.session_id, role, content)
+    st.session_state.messages.append({"role": role, "content": content})
+    st.session_state.messages, st.session_state.window_start = trim_window(
+        st.session_state.messages, st.session_state.window_start, st.session_state.history_summary, CONVERSATION_WINDOW
+    )
+
+def chatbot_interface(bot_type, timer=None):
     st.header(f"{bot_type} Chatbot")
 
     # Initialize OpenAI client
     client = get_openai_client()
 
-    # Initialize session state for messages and image analysis
-    if 'messages' not in st.session_state:
-        st.session_state.messages = []
-    if 'image_analyzed' not in st.session_state:
-        st.session_state.image_analyzed = False
+    if st.session_state.get("session_id") is None:
+        start_session(bot_type)
+
+    # The manuals are ingested when a chatbot first opens rather than inside the first reply
+    with timer.external_call("manuals") if timer else nullcontext():
+        pdf_chain = get_manual_chain()
 
     # Create columns for layout: one for the chat and one for the image
     col1, col2 = st.columns([3, 1])
@@ -92,9 +209,9 @@ def chatbot_interface(bot_type):
         if uploaded_image and not st.session_state.image_analyzed:
             st.image(uploaded_image, caption="Uploaded Image", use_column_width=True)
         
-            with st.spinner("Analyzing the image..."):
+            with st.spinner("Analyzing the image..."), (timer.external_call("vision") if timer else nullcontext()):
                 analysis_result = analyze_image_with_openai(uploaded_image, bot_type)
-                st.session_state.messages.append({"role": "assistant", "content": analysis_result})
+                record_message("assistant", analysis_result)
                 st.session_state.image_analyzed = True
 
     # Chat section (left column)
@@ -103,21 +220,27 @@ def chatbot_interface(bot_type):
         chat_container = st.container()
         
         # Display message count and input box
-        message_count = len(st.session_state.messages) // 2
+        message_count = get_conversation_store().count_messages(st.session_state.session_id, role="user")
         st.sidebar.write(f"Message Count: {message_count}/{MAX_MESSAGES}")
+        if answer_cache_loaded():
+            cache_stats = get_answer_cache().stats()
+            st.sidebar.caption(
+                f"Answer cache: {cache_stats['exact_hits']} exact / {cache_stats['semantic_hits']} similar hits, "
+                f"{cache_stats['misses']} misses"
+            )
+        if SHOW_DEBUG_METRICS:
+            with st.sidebar.expander("Latency and token metrics"):
+                st.json(METRICS.snapshot())
+                st.download_button("Download Prometheus metrics", METRICS.to_prometheus(), file_name="metrics.prom", mime="text/plain")
 
         # Input area at the bottom
+        prompt = None
         if message_count >= MAX_MESSAGES:
             st.warning(f"You have reached the maximum limit of {MAX_MESSAGES} messages. Please start a new session.")
         else:
             prompt = st.chat_input(f"Ask {bot_type} a question", key="chat_input")
             if prompt:
-                st.session_state.messages.append({"role": "user", "content": prompt})
-                
-                with st.spinner(f"The {bot_type} is thinking..."):
-                    response = chat_with_gpt(client, prompt, st.session_state.messages, bot_type=bot_type)
-                    st.session_state.messages.append({"role": "assistant", "content": response})
-                st.rerun()  # Rerun to update the chat display
+                record_message("user", prompt)
 
         # Display messages in the correct order (oldest to newest)
         with chat_container:
@@ -125,9 +248,27 @@ def chatbot_interface(bot_type):
                 with st.chat_message(message["role"]):
                     st.markdown(message["content"])
 
+            # Stream the reply into the chat, then keep the full text in the history
+            if prompt:
+                with st.chat_message("assistant"), (timer.external_call("llm") if timer else nullcontext()):
+                    response = st.write_stream(stream_chat_with_gpt(
+                        client, prompt, st.session_state.messages, pdf_chain=pdf_chain, bot_type=bot_type,
+                        answer_cache=get_answer_cache(), summary=st.session_state.history_summary
+                    ))
+                record_message("assistant", response)
+                get_conversation_store().save_summary(
+                    st.session_state.session_id,
+                    stored_summary(st.session_state.history_summary, st.session_state.window_start)
+                )
+                st.rerun()  # Rerun to update the message count
+
     # Add reset button to clear the image and chat history
+    # The old conversation stays in the store; only this browser session lets go of it
     if st.sidebar.button("Start New Session"):
+        st.session_state.session_id = None
         st.session_state.messages = []
         st.session_state.image_analyzed = False
+        st.session_state.history_summary = new_summary()
         st.session_state.selected_bot = None
+        st.query_params.pop("session", None)
         st.rerun()
\ No newline at end of file
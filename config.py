@@ -1,5 +1,96 @@
+import os
 
 # Constants
 MAX_MESSAGES = 5
 MAX_TOKENS = 5000
 MAX_HISTORY = 10
+
+# PDF ingestion
+COLLECTION_ALIAS = "Homecarepdf"
+MANIFEST_PATH = "ingest_manifest.json"
+EMBEDDING_MODEL = "text-embedding-3-small"
+EMBEDDING_SIZE = 1536
+# text-embedding-3 vectors can be shortened (e.g. 512 or 256) at a small quality cost; changing it builds a new collection
+EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS", EMBEDDING_SIZE))
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+INGEST_BATCH_SIZE = 100
+INGEST_PROCESS_WORKERS = None  # None uses one worker per CPU core
+EMBED_CONCURRENCY = 4
+UPSERT_CONCURRENCY = 2
+# Starting budget for the embedding scheduler; refined from x-ratelimit-* response headers
+EMBED_TOKENS_PER_MINUTE = 1000000
+EMBED_REQUESTS_PER_MINUTE = 3000
+
+# Embedding cache shared by ingestion and query-time embedding
+EMBEDDING_CACHE_PATH = "embedding_cache.sqlite3"
+EMBEDDING_CACHE_MAX_ENTRIES = 200000
+
+# Answer cache for context-free questions
+ANSWER_CACHE_SIMILARITY_THRESHOLD = 0.92
+ANSWER_CACHE_THRESHOLDS = {}  # Per-bot overrides, e.g. {"Pest and Bug Control": 0.95}
+ANSWER_CACHE_TTL_SECONDS = 24 * 60 * 60
+ANSWER_CACHE_MAX_ENTRIES = 500  # Per bot and source
+
+# Vector store backend: "qdrant" (remote, needs QDRANT_URL/QDRANT_API_KEY) or "local" (in-process, memory-mapped)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "qdrant")
+LOCAL_INDEX_DIR = os.getenv("LOCAL_INDEX_DIR", "vector_index")
+LOCAL_COMPACT_DELETED_FRACTION = 0.2  # Rewrite a local collection after ingestion once this share of rows is deleted
+LOCAL_IVF_LISTS = int(os.getenv("LOCAL_IVF_LISTS", "0"))  # Coarse clusters for the local index; 0 scans every row
+LOCAL_IVF_NPROBE = 8  # Clusters searched per query when LOCAL_IVF_LISTS is set
+
+# Prompt assembly (tokens)
+CONTEXT_TOKEN_BUDGET = 6000  # Prompt tokens per request; completion is capped by MAX_TOKENS
+RETRIEVAL_TOKEN_BUDGET = 2500  # Share of the budget for retrieved manual excerpts
+SUMMARY_MAX_TOKENS = 300
+
+# Image analysis: gpt-4o fits high-detail images in 2048x2048, then scales the short side to 768
+IMAGE_MAX_LONG_SIDE = 2048
+IMAGE_MAX_SHORT_SIDE = 768
+IMAGE_JPEG_QUALITY = 85
+IMAGE_ANALYSIS_CACHE_ENTRIES = 256
+IMAGE_ANALYSIS_CACHE_TTL_SECONDS = 7 * 24 * 60 * 60
+
+# Rerun latency budget; reruns slower than this are logged
+RERUN_BUDGET_MS = 30
+SHOW_RERUN_TIMINGS = os.getenv("SHOW_RERUN_TIMINGS", "").lower() in ("1", "true", "yes")
+
+# Instrumentation: per-stage latency and token counters (see instrumentation.py)
+SHOW_DEBUG_METRICS = os.getenv("SHOW_DEBUG_METRICS", "").lower() in ("1", "true", "yes")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0")) or None  # Serves /metrics and /metrics.json when set
+
+# Manual tagging and hybrid retrieval. Manuals not listed here are shared by every bot.
+PDF_FOLDER = os.getenv("PDF_FOLDER")  # When set, chat answers draw on the manuals in this folder
+MANUAL_CHAIN_RETRY_SECONDS = 300  # After the manuals fail to load, chat goes on without them this long before retrying
+PDF_BOT_TYPES = {}  # File name -> bot type, e.g. {"manual3.pdf": "Appliance Maintenance and Repairs"}
+SHARED_MANUAL_TAG = "general"
+PAYLOAD_INDEX_FIELDS = ["bot_type", "source"]
+RETRIEVAL_K = 4  # Chunks handed to the model after fusion
+RETRIEVAL_FETCH_K = 20  # Candidates taken from each of BM25 and vector search
+RRF_K = 60  # Reciprocal rank fusion damping constant
+
+# Conversation storage: "sqlite" (durable, default) or "memory"
+CONVERSATION_STORE = os.getenv("CONVERSATION_STORE", "sqlite")
+CONVERSATION_DB_PATH = os.getenv("CONVERSATION_DB_PATH", "conversations.sqlite3")
+CONVERSATION_WINDOW = 20  # Messages kept in session state; older ones are read from the store
+
+# Streaming PDF loading and near-duplicate chunk removal
+PDF_PAGE_WINDOW = 16  # Pages parsed per worker call
+NEAR_DUPLICATE_MAX_DISTANCE = 6  # SimHash bits; unrelated manual chunks are typically 17+ apart
+NEAR_DUPLICATE_MIN_CHARS = 200  # Shorter chunks are always kept; their fingerprints are too unstable
+
+# Shared OpenAI chat budget per model (tokens, requests per minute); corrected from x-ratelimit-* headers
+OPENAI_RATE_LIMITS = {"gpt-4o-mini": (200000, 500), "gpt-4o": (30000, 500)}
+OPENAI_DEFAULT_RATE_LIMIT = (30000, 500)
+OPENAI_MAX_RETRIES = 4
+OPENAI_REQUEST_DEADLINE_SECONDS = 60  # Total time a request may spend waiting for budget and retrying
+
+# Vector index layout; changing any of these builds a new collection version
+VECTOR_QUANTIZATION = os.getenv("VECTOR_QUANTIZATION", "none")  # "none", "scalar" (int8, 4x smaller) or "binary" (32x)
+QUANTIZATION_RESCORE = True  # Re-rank quantized candidates with the full-precision vectors
+QUANTIZATION_OVERSAMPLING = 3.0  # Candidates fetched per requested result when rescoring
+# Sign bits rank candidates only coarsely: binary indexes are always rescored from this larger shortlist
+BINARY_QUANTIZATION_OVERSAMPLING = 40.0
+HNSW_M = 16  # Qdrant graph degree; higher improves recall at the cost of memory
+HNSW_EF_CONSTRUCT = 100
+HNSW_EF_SEARCH = 128  # Qdrant search breadth per query
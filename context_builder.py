@@ -0,0 +1,166 @@
+import functools
+
+import tiktoken
+
+# Per-message overhead of the chat format (role markers and separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+@functools.lru_cache(maxsize=None)
+def get_encoding(model):
+    try:
+        return tiktoken.encoding_for_model(model)
+    except Exception:
+        try:
+            return tiktoken.get_encoding("o200k_base")
+        except Exception:
+            # BPE files could not be loaded (e.g. offline); fall back to a character estimate
+            return None
+
+
+def count_tokens(text, model="gpt-4o-mini"):
+    encoding = get_encoding(model)
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def message_tokens(message, model="gpt-4o-mini"):
+    return count_tokens(message["content"], model) + MESSAGE_OVERHEAD_TOKENS
+
+
+def truncate_tokens(text, max_tokens, model="gpt-4o-mini"):
+    encoding = get_encoding(model)
+    if encoding is None:
+        return text[:max_tokens * 4]
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens])
+
+
+def strip_pending_prompt(prompt, conversation_history):
+    # The interface appends the new prompt to the history before calling chat_with_gpt
+    history = list(conversation_history)
+    if history and history[-1]["role"] == "user" and history[-1]["content"] == prompt:
+        history = history[:-1]
+    return history
+
+
+def new_summary():
+    return {"text": "", "covered": 0}
+
+
+def fit_history(history, budget, summary=None, summarize=None, model="gpt-4o-mini"):
+    """Return the recent messages that fit in `budget` tokens, folding older ones into `summary`.
+
+    `summary` is a dict with the running summary text and the number of leading
+    history messages it already covers; it is updated in place. When the
+    unsummarized tail overflows, the oldest messages are folded until the tail
+    uses at most half the budget, so the kept window (and the prompt prefix the
+    provider caches) only shifts occasionally instead of on every turn.
+    """
+    if summary is None:
+        summary = new_summary()
+    covered = min(summary["covered"], len(history))
+    summary_tokens = count_tokens(summary["text"], model) if summary["text"] else 0
+    available = max(0, budget - summary_tokens)
+
+    sizes = [message_tokens(message, model) for message in history[covered:]]
+    if sum(sizes) > available:
+        target = available // 2
+        fold_until = covered
+        remaining = sum(sizes)
+        for size in sizes:
+            if remaining <= target:
+                break
+            remaining -= size
+            fold_until += 1
+        folded = history[covered:fold_until]
+        try:
+            if summarize is not None and folded:
+                summary["text"] = summarize(summary["text"], folded)
+            summary["covered"] = covered = fold_until
+        except Exception:
+            # Keep the older summary and leave the turns unfolded, so the next call retries them;
+            # this prompt just keeps whatever recent turns fit below
+            pass
+
+    kept = []
+    used = count_tokens(summary["text"], model) if summary["text"] else 0
+    for message in reversed(history[covered:]):
+        size = message_tokens(message, model)
+        if used + size > budget:
+            break
+        kept.append(message)
+        used += size
+    kept.reverse()
+    return kept, summary
+
+
+def fit_chunks(chunks, budget, model="gpt-4o-mini"):
+    # Take retrieved chunks in rank order until the budget runs out, truncating the last one
+    selected, used = [], 0
+    for chunk in chunks:
+        if used >= budget:
+            break
+        tokens = count_tokens(chunk, model)
+        if used + tokens > budget:
+            chunk = truncate_tokens(chunk, budget - used, model)
+            tokens = budget - used
+        selected.append(chunk)
+        used += tokens
+    return selected
+
+
+def context_message(chunks):
+    return {"role": "system", "content": "Relevant excerpts from the manuals:\n\n" + "\n\n---\n\n".join(chunks)}
+
+
+def assemble_messages(system_prompt, assistant_prompt, summary_text, history, chunks, prompt):
+    # Fixed prefix first so it stays identical across requests; everything that varies follows it
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "assistant", "content": assistant_prompt},
+    ]
+    if summary_text:
+        messages.append({"role": "system", "content": f"Summary of the earlier conversation: {summary_text}"})
+    messages.extend({"role": message["role"], "content": message["content"]} for message in history)
+    if chunks:
+        messages.append(context_message(chunks))
+    messages.append({"role": "user", "content": prompt})
+    return messages
+
+
+def build_context(
+    system_prompt,
+    assistant_prompt,
+    conversation_history,
+    prompt,
+    budget,
+    summary=None,
+    summarize=None,
+    retrieved_chunks=None,
+    chunk_budget=0,
+    model="gpt-4o-mini",
+):
+    """Assemble chat messages within `budget` prompt tokens.
+
+    Layout is system prompt, few-shot assistant prompt, history summary, recent
+    turns, retrieved excerpts, then the question. The first two never change for
+    a bot, which keeps the prefix identical across requests for prompt caching.
+    """
+    fixed = sum(
+        message_tokens({"role": role, "content": content}, model)
+        for role, content in (("system", system_prompt), ("assistant", assistant_prompt), ("user", prompt))
+    )
+
+    chunks = []
+    if retrieved_chunks:
+        chunks = fit_chunks(retrieved_chunks, max(0, min(chunk_budget, budget - fixed)), model)
+        if chunks:
+            fixed += message_tokens(context_message(chunks), model)
+
+    history = strip_pending_prompt(prompt, conversation_history)
+    kept, summary = fit_history(history, max(0, budget - fixed), summary, summarize, model)
+    return assemble_messages(system_prompt, assistant_prompt, summary["text"], kept, chunks, prompt)
@@ -0,0 +1,196 @@
+import functools
+import json
+import sqlite3
+import threading
+import time
+import uuid
+
+from config import CONVERSATION_STORE, CONVERSATION_DB_PATH
+from context_builder import new_summary
+
+
+def new_session_id():
+    # Random rather than time-based, so concurrent logins never share a conversation
+    return uuid.uuid4().hex
+
+
+class SQLiteConversationStore:
+    """Append-only conversation log shared by every session of the process.
+
+    Messages are numbered per session and never rewritten; only the session's
+    running summary is updated. Each thread gets its own connection, so in WAL
+    mode reruns of other sessions read while one of them is writing, and never
+    see another thread's open transaction.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "id TEXT PRIMARY KEY, bot_type TEXT NOT NULL, created_at REAL NOT NULL, updated_at REAL NOT NULL, "
+            "message_count INTEGER NOT NULL DEFAULT 0, user_message_count INTEGER NOT NULL DEFAULT 0, summary TEXT)"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS messages ("
+            "session_id TEXT NOT NULL, seq INTEGER NOT NULL, role TEXT NOT NULL, content TEXT NOT NULL, "
+            "created_at REAL NOT NULL, PRIMARY KEY (session_id, seq))"
+        )
+
+    @property
+    def conn(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = self.local.conn = sqlite3.connect(self.path, isolation_level=None, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def create_session(self, bot_type):
+        session_id = new_session_id()
+        now = time.time()
+        self.conn.execute("INSERT INTO sessions (id, bot_type, created_at, updated_at) VALUES (?, ?, ?, ?)", (session_id, bot_type, now, now))
+        return session_id
+
+    def get_session(self, session_id):
+        row = self.conn.execute(
+            "SELECT bot_type, message_count, user_message_count, summary FROM sessions WHERE id = ?", (session_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        bot_type, message_count, user_message_count, summary = row
+        return {
+            "id": session_id,
+            "bot_type": bot_type,
+            "message_count": message_count,
+            "user_message_count": user_message_count,
+            "summary": json.loads(summary) if summary else new_summary(),
+        }
+
+    def append_message(self, session_id, role, content):
+        now = time.time()
+        conn = self.conn
+        # IMMEDIATE takes the write lock up front, so two writers never read the same next seq
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            seq = conn.execute("SELECT message_count FROM sessions WHERE id = ?", (session_id,)).fetchone()[0]
+            conn.execute(
+                "INSERT INTO messages (session_id, seq, role, content, created_at) VALUES (?, ?, ?, ?, ?)",
+                (session_id, seq, role, content, now),
+            )
+            conn.execute(
+                "UPDATE sessions SET message_count = message_count + 1, "
+                "user_message_count = user_message_count + ?, updated_at = ? WHERE id = ?",
+                (role == "user", now, session_id),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return seq
+
+    def load_messages(self, session_id, start=0, limit=-1):
+        rows = self.conn.execute(
+            "SELECT role, content FROM messages WHERE session_id = ? AND seq >= ? ORDER BY seq LIMIT ?",
+            (session_id, start, limit),
+        )
+        return [{"role": role, "content": content} for role, content in rows]
+
+    def count_messages(self, session_id, role=None):
+        session = self.get_session(session_id)
+        if session is None:
+            return 0
+        return session["user_message_count"] if role == "user" else session["message_count"]
+
+    def save_summary(self, session_id, summary):
+        self.conn.execute(
+            "UPDATE sessions SET summary = ?, updated_at = ? WHERE id = ?", (json.dumps(summary), time.time(), session_id)
+        )
+
+
+class InMemoryConversationStore:
+    """Same interface kept in process memory; for development and batch runs where nothing needs to survive a restart."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sessions = {}
+        self.messages = {}
+
+    def create_session(self, bot_type):
+        session_id = new_session_id()
+        with self.lock:
+            self.sessions[session_id] = {"bot_type": bot_type, "summary": new_summary(), "user_message_count": 0}
+            self.messages[session_id] = []
+        return session_id
+
+    def get_session(self, session_id):
+        with self.lock:
+            session = self.sessions.get(session_id)
+            if session is None:
+                return None
+            return {
+                "id": session_id,
+                "bot_type": session["bot_type"],
+                "message_count": len(self.messages[session_id]),
+                "user_message_count": session["user_message_count"],
+                "summary": dict(session["summary"]),
+            }
+
+    def append_message(self, session_id, role, content):
+        with self.lock:
+            self.messages[session_id].append({"role": role, "content": content})
+            self.sessions[session_id]["user_message_count"] += role == "user"
+            return len(self.messages[session_id]) - 1
+
+    def load_messages(self, session_id, start=0, limit=-1):
+        with self.lock:
+            messages = self.messages.get(session_id, [])
+            end = len(messages) if limit < 0 else start + limit
+            return [dict(message) for message in messages[start:end]]
+
+    def count_messages(self, session_id, role=None):
+        session = self.get_session(session_id)
+        if session is None:
+            return 0
+        return session["user_message_count"] if role == "user" else session["message_count"]
+
+    def save_summary(self, session_id, summary):
+        with self.lock:
+            self.sessions[session_id]["summary"] = dict(summary)
+
+
+@functools.lru_cache(maxsize=None)
+def get_conversation_store(kind=CONVERSATION_STORE, path=CONVERSATION_DB_PATH):
+    if kind == "memory":
+        return InMemoryConversationStore()
+    if kind == "sqlite":
+        return SQLiteConversationStore(path)
+    raise ValueError(f"Unknown conversation store: {kind!r}")
+
+
+def load_window(store, session_id, window):
+    """Load the tail of a stored conversation for a resumed session.
+
+    Returns `(messages, start, summary)`: the in-memory window, the sequence
+    number of its first message, and the stored summary with `covered` made
+    relative to the window. Messages not yet folded into the summary are always
+    included, even when that exceeds `window`.
+    """
+    session = store.get_session(session_id)
+    summary = session["summary"]
+    start = max(0, min(session["message_count"] - window, summary["covered"]))
+    summary["covered"] -= start
+    return store.load_messages(session_id, start), start, summary
+
+
+def trim_window(messages, start, summary, window):
+    # Only messages the summary already covers may leave memory; the rest still feed the prompt
+    drop = min(len(messages) - window, summary["covered"])
+    if drop <= 0:
+        return messages, start
+    summary["covered"] -= drop
+    return messages[drop:], start + drop
+
+
+def stored_summary(summary, start):
+    return {"text": summary["text"], "covered": summary["covered"] + start}
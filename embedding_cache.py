@@ -0,0 +1,157 @@
+import asyncio
+import functools
+import hashlib
+import sqlite3
+import threading
+import time
+from array import array
+
+from langchain_core.embeddings import Embeddings
+from instrumentation import METRICS
+from config import EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_MAX_ENTRIES, EMBEDDING_SIZE
+
+# SQLite caps the number of bound parameters per statement
+LOOKUP_CHUNK = 500
+
+
+class EmbeddingCache:
+    """Disk-backed embedding cache keyed by model name and text hash.
+
+    Entries are evicted least-recently-used first once the cache grows past
+    `max_entries`. A single connection is shared behind a lock, so one instance
+    can serve every session and the ingestion pipeline at the same time.
+    """
+
+    def __init__(self, path, max_entries):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, model TEXT NOT NULL, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self.size = self.conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    @staticmethod
+    def make_key(model, text):
+        return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, model, texts):
+        keys = [self.make_key(model, text) for text in texts]
+        found = {}
+        with self.lock:
+            for i in range(0, len(keys), LOOKUP_CHUNK):
+                chunk = keys[i:i+LOOKUP_CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self.conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", chunk
+                ).fetchall()
+                found.update(rows)
+            if found:
+                now = time.time()
+                self.conn.execute("BEGIN")
+                self.conn.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?", [(now, key) for key in found])
+                self.conn.execute("COMMIT")
+        return [self._decode(found[key]) if key in found else None for key in keys]
+
+    def put_many(self, model, texts, vectors):
+        now = time.time()
+        rows = [
+            (self.make_key(model, text), model, array("f", vector).tobytes(), now)
+            for text, vector in zip(texts, vectors)
+        ]
+        with self.lock:
+            self.conn.execute("BEGIN")
+            self.conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)", rows)
+            self.conn.execute("COMMIT")
+            self.size += len(rows)
+            if self.size > self.max_entries:
+                self._evict()
+
+    def _evict(self):
+        # Recount first since INSERT OR REPLACE may have overwritten existing keys
+        self.size = self.conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        excess = self.size - self.max_entries
+        if excess > 0:
+            self.conn.execute(
+                "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                (excess,),
+            )
+            self.size -= excess
+
+    @staticmethod
+    def _decode(blob):
+        vector = array("f")
+        vector.frombytes(blob)
+        return vector.tolist()
+
+
+@functools.lru_cache(maxsize=None)
+def get_embedding_cache(path=EMBEDDING_CACHE_PATH, max_entries=EMBEDDING_CACHE_MAX_ENTRIES):
+    return EmbeddingCache(path, max_entries)
+
+
+def cache_model_key(model, dimensions=None):
+    # Shortened vectors differ from the full ones, so they are cached under their own key
+    if dimensions is None or dimensions == EMBEDDING_SIZE:
+        return model
+    return f"{model}:{dimensions}"
+
+
+def split_hits(cache, model, texts):
+    vectors = cache.get_many(model, texts)
+    misses = [i for i, vector in enumerate(vectors) if vector is None]
+    # Repeated texts within one call are embedded once
+    missing_texts = list(dict.fromkeys(texts[i] for i in misses))
+    METRICS.inc("embedding_cache_lookups_total", len(texts) - len(misses), result="hit")
+    METRICS.inc("embedding_cache_lookups_total", len(misses), result="miss")
+    return vectors, misses, missing_texts
+
+
+def fill_misses(vectors, misses, texts, missing_texts, new_vectors):
+    by_text = dict(zip(missing_texts, new_vectors))
+    for i in misses:
+        vectors[i] = by_text[texts[i]]
+    return vectors
+
+
+async def cached_embed_texts(cache, model, texts, embed):
+    # Async counterpart used by the ingestion pipeline; `embed` only sees cache misses
+    vectors, misses, missing_texts = await asyncio.to_thread(split_hits, cache, model, texts)
+    if misses:
+        new_vectors = await embed(missing_texts)
+        await asyncio.to_thread(cache.put_many, model, missing_texts, new_vectors)
+        fill_misses(vectors, misses, texts, missing_texts, new_vectors)
+    return vectors
+
+
+class CachedEmbeddings(Embeddings):
+    def __init__(self, embeddings, cache, model):
+        self.embeddings = embeddings
+        self.cache = cache
+        self.model = model
+
+    def embed_documents(self, texts):
+        vectors, misses, missing_texts = split_hits(self.cache, self.model, texts)
+        if misses:
+            new_vectors = self.embeddings.embed_documents(missing_texts)
+            self.cache.put_many(self.model, missing_texts, new_vectors)
+            fill_misses(vectors, misses, texts, missing_texts, new_vectors)
+        return vectors
+
+    def embed_query(self, text):
+        vector = self.cache.get_many(self.model, [text])[0]
+        METRICS.inc("embedding_cache_lookups_total", result="miss" if vector is None else "hit")
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            self.cache.put_many(self.model, [text], [vector])
+        return vector
+
+    async def aembed_documents(self, texts):
+        return await asyncio.to_thread(self.embed_documents, texts)
+
+    async def aembed_query(self, text):
+        return await asyncio.to_thread(self.embed_query, text)
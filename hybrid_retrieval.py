@@ -0,0 +1,178 @@
+import math
+import re
+from collections import Counter
+
+import numpy as np
+
+from config import RETRIEVAL_TOKEN_BUDGET, MAX_TOKENS, RETRIEVAL_K, RETRIEVAL_FETCH_K, RRF_K, SHARED_MANUAL_TAG
+from context_builder import assemble_messages, fit_chunks
+from instrumentation import METRICS
+
+WORD = re.compile(r"[a-z0-9]+")
+# Model numbers and error codes such as "WDT-780" or "F5.1"; indexed joined as well so either spelling matches
+CODE = re.compile(r"[a-z0-9]+(?:[-./][a-z0-9]+)+")
+
+
+def tokenize(text):
+    text = text.lower()
+    tokens = WORD.findall(text)
+    tokens.extend(re.sub(r"[-./]", "", code) for code in CODE.findall(text) if any(c.isdigit() for c in code))
+    return tokens
+
+
+def document_key(doc):
+    # Local documents carry their point id directly, LangChain's Qdrant store puts it in metadata
+    return str(doc.id or doc.metadata.get("_id"))
+
+
+class BM25Index:
+    """In-memory Okapi BM25 over the chunks of one collection, with the same metadata filters as vector search."""
+
+    def __init__(self, documents, k1=1.5, b=0.75):
+        self.documents = list(documents)
+        self.k1 = k1
+        self.b = b
+        postings = {}
+        lengths = []
+        for i, doc in enumerate(self.documents):
+            counts = Counter(tokenize(doc.page_content))
+            lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                postings.setdefault(term, ([], []))
+                postings[term][0].append(i)
+                postings[term][1].append(tf)
+        self.lengths = np.asarray(lengths, dtype=np.float32)
+        self.average_length = float(self.lengths.mean()) if len(self.lengths) else 0.0
+        n = len(self.documents)
+        self.postings = {
+            term: (np.asarray(rows, dtype=np.int64), np.asarray(tfs, dtype=np.float32), math.log(1 + (n - len(rows) + 0.5) / (len(rows) + 0.5)))
+            for term, (rows, tfs) in postings.items()
+        }
+        self.fields = {}
+
+    def __len__(self):
+        return len(self.documents)
+
+    def _field(self, key):
+        if key not in self.fields:
+            self.fields[key] = np.array([doc.metadata.get(key) for doc in self.documents], dtype=object)
+        return self.fields[key]
+
+    def _filter_mask(self, filter):
+        mask = np.ones(len(self.documents), dtype=bool)
+        for key, values in filter.items():
+            mask &= np.isin(self._field(key), list(values))
+        return mask
+
+    def search(self, query, k=4, filter=None):
+        if not self.documents:
+            return []
+        scores = np.zeros(len(self.documents), dtype=np.float32)
+        for term in set(tokenize(query)):
+            if term not in self.postings:
+                continue
+            rows, tfs, idf = self.postings[term]
+            norm = self.k1 * (1 - self.b + self.b * self.lengths[rows] / self.average_length)
+            scores[rows] += idf * tfs * (self.k1 + 1) / (tfs + norm)
+        candidates = scores > 0
+        if filter:
+            candidates &= self._filter_mask(filter)
+        rows = np.flatnonzero(candidates)
+        best = rows[np.argsort(-scores[rows], kind="stable")[:k]]
+        return [(self.documents[row], float(scores[row])) for row in best]
+
+
+def reciprocal_rank_fusion(rankings, k, rrf_k=RRF_K):
+    # Ranks, not raw scores, are fused: BM25 and cosine scores are on unrelated scales
+    scores, documents = {}, {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking):
+            key = document_key(doc)
+            documents.setdefault(key, doc)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank + 1)
+    best = sorted(scores, key=scores.get, reverse=True)[:k]
+    return [documents[key] for key in best]
+
+
+class HybridRetriever:
+    def __init__(self, vector_store, bm25_index, metadata_filter, k=RETRIEVAL_K, fetch_k=RETRIEVAL_FETCH_K, search_kwargs=None):
+        self.vector_store = vector_store
+        self.bm25_index = bm25_index
+        self.metadata_filter = metadata_filter
+        self.search_kwargs = search_kwargs or {}
+        self.k = k
+        self.fetch_k = fetch_k
+
+    def retrieve(self, query, bot_type=None):
+        # A bot searches its own manuals plus the shared ones
+        conditions = {"bot_type": [bot_type, SHARED_MANUAL_TAG]} if bot_type else {}
+        with METRICS.span("retrieval_vector", bot_type=bot_type):
+            vector_docs = self.vector_store.similarity_search(
+                query, k=self.fetch_k, filter=self.metadata_filter(conditions) if conditions else None, **self.search_kwargs
+            )
+        with METRICS.span("retrieval_bm25", bot_type=bot_type):
+            keyword_docs = [doc for doc, _ in self.bm25_index.search(query, self.fetch_k, conditions)]
+        return reciprocal_rank_fusion([vector_docs, keyword_docs], self.k)
+
+
+def format_excerpt(doc):
+    source = doc.metadata.get("source")
+    page = doc.metadata.get("page")
+    if source is None:
+        return doc.page_content
+    label = source if page is None else f"{source}, page {page + 1}"
+    return f"[{label}]\n{doc.page_content}"
+
+
+class PdfChain:
+    """Answers questions from the manuals: hybrid retrieval, then one chat completion.
+
+    Takes the inputs produced by `chat_with_gpt.build_chain_inputs` and returns
+    `{"answer", "source_documents"}`; `stream` yields `{"answer": piece}` dicts.
+    """
+
+    def __init__(self, client, retriever, model="gpt-4o-mini"):
+        self.client = client
+        self.retriever = retriever
+        self.model = model
+
+    def _messages(self, inputs):
+        # The history was already fitted by build_chain_inputs, with room left for the excerpts
+        documents = self.retriever.retrieve(inputs["question"], inputs.get("bot_type"))
+        history = []
+        for question, answer in inputs["chat_history"]:
+            if question:
+                history.append({"role": "user", "content": question})
+            if answer:
+                history.append({"role": "assistant", "content": answer})
+        chunks = fit_chunks([format_excerpt(doc) for doc in documents], RETRIEVAL_TOKEN_BUDGET, self.model)
+        messages = assemble_messages(
+            inputs["system_prompt"],
+            inputs["assistant_prompt"],
+            inputs.get("summary", ""),
+            history,
+            chunks,
+            inputs["question"],
+        )
+        return messages, documents
+
+    def invoke(self, inputs):
+        messages, documents = self._messages(inputs)
+        response = self.client.chat.completions.create(model=self.model, messages=messages, max_tokens=MAX_TOKENS)
+        METRICS.record_usage(response.usage, self.model, inputs.get("bot_type"))
+        return {"answer": response.choices[0].message.content.strip(), "source_documents": documents}
+
+    def stream(self, inputs):
+        messages, documents = self._messages(inputs)
+        stream = self.client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            max_tokens=MAX_TOKENS,
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+        for chunk in stream:
+            if chunk.usage is not None:
+                METRICS.record_usage(chunk.usage, self.model, inputs.get("bot_type"))
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield {"answer": chunk.choices[0].delta.content}
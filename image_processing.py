@@ -0,0 +1,30 @@
+import hashlib
+from io import BytesIO
+
+from config import IMAGE_MAX_LONG_SIDE, IMAGE_MAX_SHORT_SIDE, IMAGE_JPEG_QUALITY
+
+
+def image_sha256(image_bytes):
+    return hashlib.sha256(image_bytes).hexdigest()
+
+
+def preprocess_image(image_bytes):
+    # Downscale to what the vision model actually looks at, recompress and drop EXIF
+    from PIL import Image, ImageOps
+
+    image = Image.open(BytesIO(image_bytes))
+    # Apply the EXIF orientation before it is stripped, so phone photos stay upright
+    image = ImageOps.exif_transpose(image)
+
+    width, height = image.size
+    scale = min(1.0, IMAGE_MAX_LONG_SIDE / max(width, height), IMAGE_MAX_SHORT_SIDE / min(width, height))
+    if scale < 1.0:
+        image = image.resize((max(1, round(width * scale)), max(1, round(height * scale))), Image.LANCZOS)
+
+    buffered = BytesIO()
+    has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+    if has_alpha:
+        image.save(buffered, format="PNG", optimize=True)
+        return buffered.getvalue(), "image/png"
+    image.convert("RGB").save(buffered, format="JPEG", quality=IMAGE_JPEG_QUALITY, optimize=True)
+    return buffered.getvalue(), "image/jpeg"
@@ -0,0 +1,76 @@
+import hashlib
+import json
+import os
+import uuid
+
+MANIFEST_VERSION = 1
+
+# Fixed namespace so the same chunk always maps to the same Qdrant point id
+CHUNK_NAMESPACE = uuid.UUID("5d3f0c9e-8f57-4a51-9a63-2f7c1b6e4d10")
+
+
+def new_manifest(collection_name):
+    return {"version": MANIFEST_VERSION, "collection": collection_name, "files": {}}
+
+
+def load_manifest(path):
+    if not os.path.exists(path):
+        return new_manifest(None)
+    with open(path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("version") != MANIFEST_VERSION:
+        return new_manifest(None)
+    return manifest
+
+
+def save_manifest(manifest, path):
+    # Write to a temp file first so an interrupted run never leaves a truncated manifest
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def file_sha256(file_path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def chunk_sha256(text, page=None):
+    return hashlib.sha256(f"{page}\0{text}".encode("utf-8")).hexdigest()
+
+
+# Map each split document to a stable point id derived from its content hash.
+# Identical chunks within one file get distinct ids through an occurrence counter,
+# which is passed in when a file is assigned one page window at a time.
+def assign_chunk_ids(file_name, documents, occurrences=None):
+    chunks = {}
+    occurrences = {} if occurrences is None else occurrences
+    for doc in documents:
+        chunk_hash = chunk_sha256(doc.page_content, doc.metadata.get("page"))
+        occurrence = occurrences.get(chunk_hash, 0)
+        occurrences[chunk_hash] = occurrence + 1
+        point_id = str(uuid.uuid5(CHUNK_NAMESPACE, f"{file_name}:{chunk_hash}:{occurrence}"))
+        chunks[point_id] = (chunk_hash, doc)
+    return chunks
+
+
+def duplicate_references(manifest):
+    # Stored point id -> the near-duplicate chunks that were folded into it instead of being stored
+    references = {}
+    for file_name, entry in sorted(manifest["files"].items()):
+        for point_id, page in entry.get("duplicates", []):
+            references.setdefault(point_id, []).append({"source": file_name, "page": page})
+    return references
+
+
+def dangling_duplicates(manifest):
+    # Files whose skipped chunks point at a chunk that is no longer stored
+    stored = {point_id for entry in manifest["files"].values() for point_id in entry["chunks"]}
+    return sorted(
+        file_name for file_name, entry in manifest["files"].items()
+        if any(point_id not in stored for point_id, _ in entry.get("duplicates", []))
+    )
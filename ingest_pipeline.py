@@ -0,0 +1,241 @@
+import asyncio
+import multiprocessing
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+
+from openai import RateLimitError
+from openai_gateway import RETRYABLE_ERRORS
+from rate_limit import retry_after_seconds
+from instrumentation import METRICS
+
+# Rough chars-per-token ratio for English text; only used to size requests against the budget
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+# Opened per window rather than cached: a reader keeps every object it has resolved, so a
+# cached one grows towards the whole manual in every worker process that reads it.
+def open_pdf(file_path):
+    from pypdf import PdfReader
+
+    return PdfReader(file_path)
+
+
+def pdf_page_count(file_path):
+    return len(open_pdf(file_path).pages)
+
+
+def split_pdf(file_path, chunk_size, chunk_overlap, start=0, end=None):
+    # Runs in a worker process, so keep the heavy imports out of the parent.
+    # Only pages [start, end) are extracted; PyPDFLoader.load() would hold the whole manual in memory.
+    from langchain_core.documents import Document
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+    reader = open_pdf(file_path)
+    end = len(reader.pages) if end is None else min(end, len(reader.pages))
+    # Same page documents PyPDFLoader produces; chunks never span pages either way
+    pages = (
+        Document(page_content=reader.pages[page].extract_text(), metadata={"source": file_path, "page": page})
+        for page in range(start, end)
+    )
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    return text_splitter.split_documents(pages)
+
+
+class IngestJob:
+    def __init__(self, file_name, file_path, file_hash, entry):
+        self.file_name = file_name
+        self.file_path = file_path
+        self.file_hash = file_hash
+        self.entry = entry
+        # Documents waiting to be embedded and stored; dropped once their batch is upserted
+        self.chunks = {}
+        # Every chunk kept for the file so far, point id -> content hash
+        self.chunk_hashes = {}
+        self.occurrences = {}
+        self.fingerprints = {}
+        self.duplicates = []
+        self.removed = []
+        self.pending_batches = 0
+        self.error = None
+
+
+async def embed_texts(openai_client, model, texts, scheduler, max_retries=5, dimensions=None):
+    tokens = sum(estimate_tokens(text) for text in texts)
+    for attempt in range(max_retries):
+        await scheduler.acquire_async(tokens)
+        try:
+            options = {"dimensions": dimensions} if dimensions else {}
+            raw = await openai_client.embeddings.with_raw_response.create(model=model, input=texts, **options)
+        except RETRYABLE_ERRORS as e:
+            if attempt == max_retries - 1:
+                raise
+            response = getattr(e, "response", None)
+            headers = response.headers if response is not None else None
+            scheduler.observe_headers(headers)
+            wait = retry_after_seconds(headers, attempt) + random.uniform(0, 1)
+            if isinstance(e, RateLimitError):
+                METRICS.inc("retries_total", stage="embeddings", reason="rate_limit")
+                # Every batch shares the budget, so all of them back off
+                scheduler.pause(wait)
+            else:
+                METRICS.inc("retries_total", stage="embeddings", reason=type(e).__name__)
+                await asyncio.sleep(wait)
+            continue
+        scheduler.observe_headers(raw.headers)
+        response = raw.parse()
+        METRICS.inc("embedding_tokens_total", response.usage.total_tokens, model=model)
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+
+def make_batches(point_ids, chunks, token_budget, max_batch_size):
+    batch, batch_tokens = [], 0
+    for point_id in point_ids:
+        tokens = estimate_tokens(chunks[point_id][1].page_content)
+        if batch and (len(batch) >= max_batch_size or batch_tokens + tokens > token_budget):
+            yield batch
+            batch, batch_tokens = [], 0
+        batch.append(point_id)
+        batch_tokens += tokens
+    if batch:
+        yield batch
+
+
+async def run_ingestion(
+    jobs,
+    prepare_job,
+    embed_batch,
+    upsert_batch,
+    scheduler,
+    on_job_done,
+    chunk_size,
+    chunk_overlap,
+    max_batch_size,
+    process_workers=None,
+    embed_concurrency=4,
+    upsert_concurrency=2,
+    page_window=16,
+    log=print,
+):
+    """Parse, embed and upsert PDFs as overlapping stages.
+
+    Files are read `page_window` pages at a time in a process pool, embedding
+    requests run concurrently under the shared `scheduler`, and upserts drain a
+    separate queue so network waits of the three stages overlap. The bounded
+    queues push back on parsing, so memory holds a few windows rather than
+    whole manuals. `prepare_job(job, documents)` is called once per window; it
+    adds the documents to embed to `job.chunks` and returns their point ids.
+    `on_job_done(job)` is called once every batch of a file has been stored.
+    """
+    loop = asyncio.get_running_loop()
+    embed_queue = asyncio.Queue(maxsize=embed_concurrency * 2)
+    upsert_queue = asyncio.Queue(maxsize=upsert_concurrency * 2)
+    split_slots = asyncio.Semaphore(process_workers or os.cpu_count() or 1)
+
+    def finish_batch(job):
+        job.pending_batches -= 1
+        if job.pending_batches == 0 and job.error is None:
+            # A failure here must not kill the worker, or the queue it serves is never drained
+            try:
+                on_job_done(job)
+            except Exception as e:
+                job.error = e
+                log(f"Error finishing file {job.file_name}: {str(e)}")
+
+    async def queue_batch(job, batch):
+        job.pending_batches += 1
+        await embed_queue.put((job, batch))
+
+    async def split_file(pool, job):
+        # The extra count is released at the end, so the job cannot complete while windows are still being read
+        job.pending_batches = 1
+        next_window = None
+
+        def read_window(start):
+            return loop.run_in_executor(pool, split_pdf, job.file_path, chunk_size, chunk_overlap, start, start + page_window)
+
+        async with split_slots:
+            try:
+                page_count = await loop.run_in_executor(pool, pdf_page_count, job.file_path)
+                # One window is read ahead while the previous one is being queued
+                pending = []
+                next_window = read_window(0) if page_count else None
+                for start in range(0, page_count, page_window):
+                    documents = await next_window
+                    next_window = read_window(start + page_window) if start + page_window < page_count else None
+                    pending.extend(prepare_job(job, documents))
+                    token_budget = scheduler.request_token_budget(embed_concurrency)
+                    batches = list(make_batches(pending, job.chunks, token_budget, max_batch_size))
+                    # The last, possibly partial, batch is topped up by the next window
+                    pending = batches.pop() if batches else []
+                    for batch in batches:
+                        await queue_batch(job, batch)
+                    if job.error is not None:
+                        break
+                if pending and job.error is None:
+                    await queue_batch(job, pending)
+            except Exception as e:
+                job.error = e
+                log(f"Error processing {job.file_name}: {str(e)}")
+            if next_window is not None:
+                # A file that stopped early still has its read-ahead in flight
+                await asyncio.gather(next_window, return_exceptions=True)
+        finish_batch(job)
+
+    async def embed_worker():
+        while True:
+            job, batch = await embed_queue.get()
+            vectors = None
+            try:
+                if job.error is None:
+                    texts = [job.chunks[point_id][1].page_content for point_id in batch]
+                    with METRICS.span("ingest_embed_batch"):
+                        vectors = await embed_batch(texts)
+            except Exception as e:
+                job.error = e
+                log(f"Error embedding batch for file {job.file_name}: {str(e)}")
+            try:
+                if vectors is None:
+                    finish_batch(job)
+                else:
+                    await upsert_queue.put((job, batch, vectors))
+            finally:
+                embed_queue.task_done()
+
+    async def upsert_worker():
+        while True:
+            job, batch, vectors = await upsert_queue.get()
+            try:
+                if job.error is None:
+                    documents = [job.chunks[point_id][1] for point_id in batch]
+                    with METRICS.span("ingest_upsert_batch"):
+                        await upsert_batch(batch, vectors, documents)
+                    METRICS.inc("ingested_chunks_total", len(batch))
+                    for point_id in batch:
+                        del job.chunks[point_id]
+                    log(f"Added {len(batch)} chunks for file {job.file_name}")
+            except Exception as e:
+                job.error = e
+                log(f"Error adding batch for file {job.file_name}: {str(e)}")
+            finally:
+                try:
+                    finish_batch(job)
+                finally:
+                    upsert_queue.task_done()
+
+    workers = [asyncio.create_task(embed_worker()) for _ in range(embed_concurrency)]
+    workers += [asyncio.create_task(upsert_worker()) for _ in range(upsert_concurrency)]
+    try:
+        # spawn keeps the worker processes independent of the parent's threads
+        with ProcessPoolExecutor(max_workers=process_workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            await asyncio.gather(*(split_file(pool, job) for job in jobs))
+        await embed_queue.join()
+        await upsert_queue.join()
+    finally:
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
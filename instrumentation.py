@@ -0,0 +1,145 @@
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (seconds) of the latency histogram buckets
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def label_key(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items() if value is not None))
+
+
+class Metrics:
+    """Process-wide counters and latency histograms, shared by every Streamlit session."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+
+    def inc(self, name, value=1, **labels):
+        key = (name, label_key(labels))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        key = (name, label_key(labels))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = {"count": 0, "sum": 0.0, "max": 0.0, "buckets": [0] * len(BUCKETS)}
+            histogram["count"] += 1
+            histogram["sum"] += seconds
+            histogram["max"] = max(histogram["max"], seconds)
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    histogram["buckets"][i] += 1
+
+    @contextmanager
+    def span(self, name, **labels):
+        # Times the block as <name>_seconds and counts failures by exception type before re-raising
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self.inc("errors_total", stage=name, error=type(e).__name__)
+            raise
+        finally:
+            self.observe(f"{name}_seconds", time.perf_counter() - start, **labels)
+
+    def record_usage(self, usage, model, bot_type=None):
+        if usage is None:
+            return
+        self.inc("prompt_tokens_total", usage.prompt_tokens or 0, model=model, bot_type=bot_type)
+        self.inc("completion_tokens_total", usage.completion_tokens or 0, model=model, bot_type=bot_type)
+
+    def reset(self):
+        with self.lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def snapshot(self):
+        with self.lock:
+            counters = [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(self.counters.items())
+            ]
+            histograms = [
+                {
+                    "name": name,
+                    "labels": dict(labels),
+                    "count": histogram["count"],
+                    "sum": histogram["sum"],
+                    "mean": histogram["sum"] / histogram["count"],
+                    "max": histogram["max"],
+                }
+                for (name, labels), histogram in sorted(self.histograms.items())
+            ]
+        return {"counters": counters, "histograms": histograms}
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self):
+        def format_labels(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ""
+            escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+            return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + "}"
+
+        lines = []
+        with self.lock:
+            typed = set()
+            for (name, labels), value in sorted(self.counters.items()):
+                if name not in typed:
+                    lines.append(f"# TYPE homecare_{name} counter")
+                    typed.add(name)
+                lines.append(f"homecare_{name}{format_labels(labels)} {value}")
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                if name not in typed:
+                    lines.append(f"# TYPE homecare_{name} histogram")
+                    typed.add(name)
+                for bound, count in zip(BUCKETS, histogram["buckets"]):
+                    lines.append(f"homecare_{name}_bucket{format_labels(labels, [('le', str(bound))])} {count}")
+                lines.append(f"homecare_{name}_bucket{format_labels(labels, [('le', '+Inf')])} {histogram['count']}")
+                lines.append(f"homecare_{name}_sum{format_labels(labels)} {histogram['sum']}")
+                lines.append(f"homecare_{name}_count{format_labels(labels)} {histogram['count']}")
+        return "\n".join(lines) + "\n"
+
+
+METRICS = Metrics()
+
+
+def start_metrics_server(port, metrics=METRICS, host="0.0.0.0"):
+    # Serves /metrics (Prometheus text format) and /metrics.json from a daemon thread
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            if self.path == "/metrics":
+                body, content_type = metrics.to_prometheus(), "text/plain; version=0.0.4"
+            elif self.path == "/metrics.json":
+                body, content_type = metrics.to_json(), "application/json"
+            else:
+                self.send_error(404)
+                return
+            payload = body.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logger.info("Serving metrics on port %d", port)
+    return server
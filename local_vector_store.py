@@ -0,0 +1,474 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import uuid
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+
+VECTORS_FILE = "vectors.f32"
+METADATA_FILE = "metadata.sqlite3"
+CENTROIDS_FILE = "ivf_centroids.npy"
+COMPACT_FILE = "vectors.f32.compact"
+INITIAL_CAPACITY = 1024
+QUANTIZATIONS = ("none", "scalar", "binary")
+# Rows scored per step when scanning quantized codes, to bound the float32 temporaries
+SCAN_BLOCK = 8192
+POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+METADATA_KEY = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+def metadata_path(key):
+    # Paths are inlined rather than bound so SQLite can match them against the expression indexes
+    if not METADATA_KEY.match(key):
+        raise ValueError(f"Unsupported metadata key: {key!r}")
+    return f"json_extract(metadata, '$.{key}')"
+
+
+def normalize_rows(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors[None, :]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return vectors / norms
+
+
+def scalar_scale(vectors):
+    # Full range rather than a clipping quantile: text-embedding-3 puts more weight in the leading
+    # dimensions, and clipping saturates exactly those. A later batch beyond the range refits it.
+    return 127.0 / max(float(np.abs(vectors).max()), 1e-6)
+
+
+def quantize(vectors, quantization, scale=None):
+    if quantization == "scalar":
+        return np.clip(np.rint(vectors * scale), -127, 127).astype(np.int8)
+    return np.packbits(vectors > 0, axis=1)
+
+
+def top_k(scores, k):
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    best = np.argpartition(-scores, k - 1)[:k]
+    return best[np.argsort(-scores[best])]
+
+
+class LocalVectorStore(VectorStore):
+    """In-process cosine vector store backed by a memory-mapped float32 file.
+
+    Vectors are normalized on insert and live in `vectors.f32` inside `path`;
+    ids, page content and metadata are persisted in SQLite next to it. Search is
+    a vectorized dot product over the live rows, optionally narrowed by an
+    IVF-style coarse index built with `build_ivf`. Deleted rows are tombstoned
+    and dropped by `compact`.
+
+    With `quantization` "scalar" (int8, 4x smaller) or "binary" (1 bit per
+    dimension, 32x smaller) only the quantized codes are scanned from RAM; the
+    best `k * oversampling` candidates are then rescored with the float32 rows,
+    which stay on disk and in the page cache. The quantization is fixed when
+    the index is created.
+    """
+
+    def __init__(self, path, embedding=None, dim=None, quantization="none", oversampling=3.0, rescore=True):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self._embedding = embedding
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(os.path.join(path, METADATA_FILE), check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS points ("
+            "row INTEGER PRIMARY KEY, id TEXT NOT NULL, page_content TEXT NOT NULL, metadata TEXT NOT NULL, "
+            "deleted INTEGER NOT NULL DEFAULT 0, list INTEGER NOT NULL DEFAULT -1)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS points_id ON points (id)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS info (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+
+        stored_dim = self._get_info("dim")
+        if stored_dim is None:
+            if dim is None:
+                raise ValueError(f"No index at {path}; pass dim to create one.")
+            self._set_info("dim", dim)
+            stored_dim = dim
+            if quantization not in QUANTIZATIONS:
+                raise ValueError(f"Unknown quantization {quantization!r}; expected one of {QUANTIZATIONS}")
+            self._set_info("quantization", quantization)
+        self.dim = int(stored_dim)
+        self.quantization = self._get_info("quantization") or "none"
+        self.oversampling = oversampling
+        self.rescore = rescore
+        self._load()
+
+    @property
+    def embeddings(self):
+        return self._embedding
+
+    def set_embeddings(self, embedding):
+        self._embedding = embedding
+
+    def _get_info(self, key):
+        row = self.conn.execute("SELECT value FROM info WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _set_info(self, key, value):
+        self.conn.execute("INSERT OR REPLACE INTO info VALUES (?, ?)", (key, json.dumps(value)))
+
+    def _finish_compact(self):
+        # The metadata commit decides whether an interrupted compaction happened
+        compact_path = os.path.join(self.path, COMPACT_FILE)
+        if self._get_info("pending_vectors"):
+            if os.path.exists(compact_path):
+                os.replace(compact_path, os.path.join(self.path, VECTORS_FILE))
+            self.conn.execute("DELETE FROM info WHERE key = 'pending_vectors'")
+        elif os.path.exists(compact_path):
+            os.remove(compact_path)
+
+    def _load(self):
+        self._finish_compact()
+        self.scale = self._get_info("scalar_scale")
+        rows = self.conn.execute("SELECT row, id, deleted, list FROM points ORDER BY row").fetchall()
+        self.count = rows[-1][0] + 1 if rows else 0
+        self.live = np.zeros(self.count, dtype=bool)
+        self.lists = np.full(self.count, -1, dtype=np.int32)
+        self.row_ids = [None] * self.count
+        self.rows_by_id = {}
+        for row, point_id, deleted, list_id in rows:
+            self.row_ids[row] = point_id
+            self.lists[row] = list_id
+            if not deleted:
+                self.live[row] = True
+                self.rows_by_id[point_id] = row
+
+        vectors_path = os.path.join(self.path, VECTORS_FILE)
+        capacity = max(INITIAL_CAPACITY, self.count)
+        if os.path.exists(vectors_path):
+            capacity = max(capacity, os.path.getsize(vectors_path) // (4 * self.dim))
+        self._map_vectors(capacity)
+        self.codes = None
+        if self.quantization != "none" and self.count:
+            self.codes = np.concatenate([
+                quantize(np.asarray(self.vectors[start:start + SCAN_BLOCK]), self.quantization, self.scale)
+                for start in range(0, self.count, SCAN_BLOCK)
+            ])
+
+        centroids_path = os.path.join(self.path, CENTROIDS_FILE)
+        self.centroids = np.load(centroids_path) if os.path.exists(centroids_path) else None
+
+    def _map_vectors(self, capacity):
+        vectors_path = os.path.join(self.path, VECTORS_FILE)
+        size = capacity * self.dim * 4
+        with open(vectors_path, "ab") as f:
+            if f.tell() < size:
+                f.truncate(size)
+        self.capacity = capacity
+        self.vectors = np.memmap(vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+
+    def _ensure_capacity(self, needed):
+        if needed > self.capacity:
+            self.vectors.flush()
+            capacity = self.capacity
+            while capacity < needed:
+                capacity *= 2
+            self._map_vectors(capacity)
+
+    def _grow_row_arrays(self, needed):
+        if needed > len(self.live):
+            extra = needed - len(self.live)
+            self.live = np.concatenate([self.live, np.zeros(extra, dtype=bool)])
+            self.lists = np.concatenate([self.lists, np.full(extra, -1, dtype=np.int32)])
+            self.row_ids.extend([None] * extra)
+
+    def _store_codes(self, start, codes):
+        # Grows by doubling like the vector file, so appending stays amortized O(batch)
+        end = start + len(codes)
+        if self.codes is None or len(self.codes) < end:
+            capacity = max(end, INITIAL_CAPACITY, 2 * (0 if self.codes is None else len(self.codes)))
+            grown = np.zeros((capacity, codes.shape[1]), dtype=codes.dtype)
+            if self.codes is not None:
+                grown[:start] = self.codes[:start]
+            self.codes = grown
+        self.codes[start:end] = codes
+
+    def _fit_scale(self, rows):
+        peak = max((float(np.abs(self.vectors[rows[start:start + SCAN_BLOCK]]).max()) for start in range(0, len(rows), SCAN_BLOCK)), default=0.0)
+        return 127.0 / max(peak, 1e-6)
+
+    def _requantize(self):
+        # Refit the scalar range to every live row, since the first batch may not have covered it
+        live_rows = np.flatnonzero(self.live[:self.count])
+        if self.quantization != "scalar" or len(live_rows) == 0:
+            return
+        self.scale = self._fit_scale(live_rows)
+        self._set_info("scalar_scale", self.scale)
+        for start in range(0, self.count, SCAN_BLOCK):
+            self._store_codes(start, quantize(np.asarray(self.vectors[start:start + SCAN_BLOCK]), "scalar", self.scale))
+
+    def add_embeddings(self, texts, embeddings, metadatas=None, ids=None):
+        texts = list(texts)
+        metadatas = list(metadatas) if metadatas is not None else [{} for _ in texts]
+        ids = [str(point_id) for point_id in ids] if ids is not None else [str(uuid.uuid4()) for _ in texts]
+        vectors = normalize_rows(embeddings)
+        if vectors.shape[1] != self.dim:
+            raise ValueError(f"Expected {self.dim}-dim vectors, got {vectors.shape[1]}")
+
+        with self.lock:
+            start = self.count
+            end = start + len(texts)
+            self._ensure_capacity(end)
+            self._grow_row_arrays(end)
+            self.vectors[start:end] = vectors
+            self.vectors.flush()
+            lists = self._assign_lists(vectors)
+            refit = False
+            if self.quantization != "none":
+                if self.quantization == "scalar" and self.scale is None:
+                    # The first batch fixes the scale so codes of every row stay comparable
+                    self.scale = scalar_scale(vectors)
+                    self._set_info("scalar_scale", self.scale)
+                # Codes of this batch would be clipped; all rows are requantized once it is stored
+                refit = self.quantization == "scalar" and scalar_scale(vectors) < self.scale
+                self._store_codes(start, quantize(vectors, self.quantization, self.scale))
+
+            # Re-adding an id replaces the previous row, matching Qdrant upsert semantics
+            replaced = [self.rows_by_id[point_id] for point_id in ids if point_id in self.rows_by_id]
+            self.conn.execute("BEGIN")
+            if replaced:
+                self.conn.executemany("UPDATE points SET deleted = 1 WHERE row = ?", [(row,) for row in replaced])
+            self.conn.executemany(
+                "INSERT INTO points (row, id, page_content, metadata, list) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (start + i, point_id, text, json.dumps(metadata), int(lists[i]))
+                    for i, (point_id, text, metadata) in enumerate(zip(ids, texts, metadatas))
+                ],
+            )
+            self.conn.execute("COMMIT")
+
+            self.live[replaced] = False
+            self.live[start:end] = True
+            self.lists[start:end] = lists
+            for i, point_id in enumerate(ids):
+                self.row_ids[start + i] = point_id
+                self.rows_by_id[point_id] = start + i
+            self.count = end
+            if refit:
+                self._requantize()
+        return ids
+
+    def add_texts(self, texts, metadatas=None, ids=None, **kwargs):
+        texts = list(texts)
+        return self.add_embeddings(texts, self._embedding.embed_documents(texts), metadatas, ids)
+
+    def delete(self, ids=None, **kwargs):
+        if not ids:
+            return False
+        with self.lock:
+            rows = [self.rows_by_id.pop(str(point_id)) for point_id in ids if str(point_id) in self.rows_by_id]
+            if rows:
+                self.conn.execute("BEGIN")
+                self.conn.executemany("UPDATE points SET deleted = 1 WHERE row = ?", [(row,) for row in rows])
+                self.conn.execute("COMMIT")
+                self.live[rows] = False
+        return True
+
+    def _filter_mask(self, filter):
+        # Equality filter on metadata keys; a list value matches any of its items
+        clauses, params = [], []
+        for key, value in filter.items():
+            values = value if isinstance(value, (list, tuple, set)) else [value]
+            clauses.append(f"{metadata_path(key)} IN ({','.join('?' * len(values))})")
+            params.extend(values)
+        mask = np.zeros(self.count, dtype=bool)
+        rows = self.conn.execute(f"SELECT row FROM points WHERE deleted = 0 AND {' AND '.join(clauses)}", params)
+        mask[[row for (row,) in rows]] = True
+        return mask
+
+    def update_metadata(self, point_id, values):
+        with self.lock:
+            row = self.conn.execute("SELECT row, metadata FROM points WHERE id = ? AND deleted = 0", (point_id,)).fetchone()
+            if row is None:
+                raise KeyError(point_id)
+            metadata = json.loads(row[1])
+            metadata.update(values)
+            self.conn.execute("UPDATE points SET metadata = ? WHERE row = ?", (json.dumps(metadata), row[0]))
+
+    def create_metadata_indexes(self, fields):
+        with self.lock:
+            for field in fields:
+                self.conn.execute(f"CREATE INDEX IF NOT EXISTS points_{field} ON points ({metadata_path(field)})")
+
+    def iter_documents(self):
+        rows = self.conn.execute("SELECT id, page_content, metadata FROM points WHERE deleted = 0 ORDER BY row").fetchall()
+        for point_id, page_content, metadata in rows:
+            yield Document(id=point_id, page_content=page_content, metadata=json.loads(metadata))
+
+    def _candidate_rows(self, query, filter=None, nprobe=None):
+        with self.lock:
+            count = self.count
+            mask = self.live[:count].copy()
+            if filter:
+                mask &= self._filter_mask(filter)
+            if self.centroids is not None and nprobe:
+                probes = top_k(self.centroids @ query, nprobe)
+                mask &= np.isin(self.lists[:count], probes)
+        return np.flatnonzero(mask)
+
+    def _approximate_scores(self, query, rows):
+        # Larger is closer: int8 dot products, or the negated Hamming distance between sign bits
+        codes = self.codes
+        scores = np.empty(len(rows), dtype=np.float32)
+        if self.quantization == "scalar":
+            query = query * (1.0 / self.scale)
+            for start in range(0, len(rows), SCAN_BLOCK):
+                block = rows[start:start + SCAN_BLOCK]
+                scores[start:start + len(block)] = codes[block].astype(np.float32) @ query
+        else:
+            query_bits = np.packbits(query > 0)
+            for start in range(0, len(rows), SCAN_BLOCK):
+                block = rows[start:start + SCAN_BLOCK]
+                scores[start:start + len(block)] = -POPCOUNT[codes[block] ^ query_bits].sum(axis=1, dtype=np.int32)
+        return scores
+
+    def similarity_search_with_score_by_vector(self, embedding, k=4, filter=None, nprobe=None, rescore=None, **kwargs):
+        query = normalize_rows(embedding)[0]
+        rows = self._candidate_rows(query, filter, nprobe)
+        if len(rows) == 0:
+            return []
+        if self.quantization == "none":
+            scores = self.vectors[rows] @ query
+            best = top_k(scores, k)
+            return self._documents([int(rows[i]) for i in best], [float(scores[i]) for i in best])
+
+        rescore = self.rescore if rescore is None else rescore
+        scores = self._approximate_scores(query, rows)
+        shortlist = rows[top_k(scores, max(k, int(k * self.oversampling)) if rescore else k)]
+        if not rescore:
+            # Ranked by the codes alone; the returned rows still report their cosine similarity
+            return self._documents([int(row) for row in shortlist], [float(self.vectors[row] @ query) for row in shortlist])
+        shortlist = np.sort(shortlist)
+        exact = self.vectors[shortlist] @ query
+        best = top_k(exact, k)
+        return self._documents([int(shortlist[i]) for i in best], [float(exact[i]) for i in best])
+
+    def memory_bytes(self):
+        # What a search keeps resident: the quantized codes, or the full vectors without quantization
+        if self.quantization == "none":
+            return self.count * self.dim * 4
+        return 0 if self.codes is None else self.codes[:self.count].nbytes
+
+    def _documents(self, rows, scores):
+        placeholders = ",".join("?" * len(rows))
+        records = {
+            row: (point_id, page_content, metadata)
+            for row, point_id, page_content, metadata in self.conn.execute(
+                f"SELECT row, id, page_content, metadata FROM points WHERE row IN ({placeholders})", rows
+            )
+        }
+        results = []
+        for row, score in zip(rows, scores):
+            point_id, page_content, metadata = records[row]
+            results.append((Document(id=point_id, page_content=page_content, metadata=json.loads(metadata)), score))
+        return results
+
+    def similarity_search_by_vector(self, embedding, k=4, filter=None, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k, filter, **kwargs)]
+
+    def similarity_search_with_score(self, query, k=4, filter=None, **kwargs):
+        return self.similarity_search_with_score_by_vector(self._embedding.embed_query(query), k, filter, **kwargs)
+
+    def similarity_search(self, query, k=4, filter=None, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, filter, **kwargs)]
+
+    def _select_relevance_score_fn(self):
+        # Scores are already cosine similarities
+        return lambda score: score
+
+    def _assign_lists(self, vectors):
+        if self.centroids is None:
+            return np.full(len(vectors), -1, dtype=np.int32)
+        return np.argmax(vectors @ self.centroids.T, axis=1).astype(np.int32)
+
+    def build_ivf(self, n_lists=None, iterations=10, seed=0):
+        """Cluster live vectors with spherical k-means and assign every row to a list."""
+        with self.lock:
+            live_rows = np.flatnonzero(self.live[:self.count])
+            if len(live_rows) == 0:
+                return
+            n_lists = n_lists or max(1, int(np.sqrt(len(live_rows))))
+            data = np.asarray(self.vectors[live_rows])
+            rng = np.random.default_rng(seed)
+            centroids = data[rng.choice(len(data), size=min(n_lists, len(data)), replace=False)]
+            for _ in range(iterations):
+                assignments = np.argmax(data @ centroids.T, axis=1)
+                for list_id in range(len(centroids)):
+                    members = data[assignments == list_id]
+                    if len(members):
+                        centroids[list_id] = members.mean(axis=0)
+                centroids = normalize_rows(centroids)
+
+            self.centroids = centroids
+            np.save(os.path.join(self.path, CENTROIDS_FILE), centroids)
+            lists = self._assign_lists(np.asarray(self.vectors[:self.count]))
+            self.lists[:self.count] = lists
+            self.conn.execute("BEGIN")
+            self.conn.executemany("UPDATE points SET list = ? WHERE row = ?", [(int(l), row) for row, l in enumerate(lists)])
+            self.conn.execute("COMMIT")
+            self._requantize()
+
+    def compact(self):
+        """Rewrite the index without tombstoned rows.
+
+        The compacted vectors are written to a side file first and swapped in
+        only after the renumbered metadata commits, so an interruption at any
+        point leaves either the old or the new index.
+        """
+        with self.lock:
+            live_rows = np.flatnonzero(self.live[:self.count])
+            compact_path = os.path.join(self.path, COMPACT_FILE)
+            capacity = max(INITIAL_CAPACITY, len(live_rows))
+            with open(compact_path, "wb") as f:
+                f.truncate(capacity * self.dim * 4)
+            compacted = np.memmap(compact_path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+            for start in range(0, len(live_rows), SCAN_BLOCK):
+                block = live_rows[start:start + SCAN_BLOCK]
+                compacted[start:start + len(block)] = self.vectors[block]
+            compacted.flush()
+            del compacted
+            with open(compact_path, "rb") as f:
+                os.fsync(f.fileno())
+
+            self.conn.execute("BEGIN")
+            try:
+                self.conn.execute("DELETE FROM points WHERE deleted = 1")
+                # Ascending order only ever moves a row down into a slot already vacated
+                self.conn.executemany(
+                    "UPDATE points SET row = ? WHERE row = ?",
+                    [(new_row, int(row)) for new_row, row in enumerate(live_rows) if new_row != row],
+                )
+                if self.quantization == "scalar" and len(live_rows):
+                    # _load rebuilds the codes with the range refitted to the surviving rows
+                    self._set_info("scalar_scale", self._fit_scale(live_rows))
+                self._set_info("pending_vectors", True)
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                os.remove(compact_path)
+                raise
+            self._load()
+
+    def deleted_fraction(self):
+        return (self.count - len(self.rows_by_id)) / self.count if self.count else 0.0
+
+    def __len__(self):
+        return len(self.rows_by_id)
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, ids=None, path=None, **kwargs):
+        texts = list(texts)
+        vectors = embedding.embed_documents(texts)
+        store = cls(path, embedding, dim=len(vectors[0]) if vectors else None, quantization=kwargs.get("quantization", "none"))
+        store.add_embeddings(texts, vectors, metadatas, ids)
+        return store
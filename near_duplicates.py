@@ -0,0 +1,57 @@
+import hashlib
+import re
+
+import numpy as np
+
+WORD = re.compile(r"\w+")
+SIMHASH_BITS = 64
+
+
+def simhash(text, shingle_size=3):
+    """64-bit SimHash over word shingles; near-identical texts differ in only a few bits."""
+    words = WORD.findall(text.lower())
+    if not words:
+        return 0
+    shingles = {" ".join(words[i:i + shingle_size]) for i in range(max(1, len(words) - shingle_size + 1))}
+    hashes = np.array(
+        [int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "little") for shingle in shingles],
+        dtype="<u8",
+    )
+    # Column j of `bits` is bit j of each shingle hash; a fingerprint bit is set when most shingles set it
+    bits = np.unpackbits(hashes.view(np.uint8).reshape(-1, 8), axis=1, bitorder="little")
+    votes = bits.sum(axis=0) * 2 > len(hashes)
+    return int(np.packbits(votes, bitorder="little").view("<u8")[0])
+
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count("1")
+
+
+class SimHashIndex:
+    """Finds a stored fingerprint within `max_distance` bits of a query.
+
+    The 64 bits are cut into `max_distance + 1` bands. Two fingerprints that
+    differ in at most `max_distance` bits must agree exactly on at least one
+    band, so only fingerprints sharing a band are compared.
+    """
+
+    def __init__(self, max_distance=3):
+        self.max_distance = max_distance
+        bands = max_distance + 1
+        bounds = [SIMHASH_BITS * i // bands for i in range(bands + 1)]
+        self.bands = [(start, (1 << (end - start)) - 1) for start, end in zip(bounds, bounds[1:])]
+        self.tables = [{} for _ in self.bands]
+
+    def _keys(self, fingerprint):
+        return [(fingerprint >> start) & mask for start, mask in self.bands]
+
+    def add(self, fingerprint, point_id):
+        for table, key in zip(self.tables, self._keys(fingerprint)):
+            table.setdefault(key, []).append((fingerprint, point_id))
+
+    def find(self, fingerprint):
+        for table, key in zip(self.tables, self._keys(fingerprint)):
+            for candidate, point_id in table.get(key, ()):
+                if hamming_distance(fingerprint, candidate) <= self.max_distance:
+                    return point_id
+        return None
@@ -0,0 +1,133 @@
+import functools
+import hashlib
+import json
+import random
+import threading
+import time
+from concurrent.futures import Future
+from types import SimpleNamespace
+
+from openai import OpenAI, RateLimitError, APIConnectionError, APITimeoutError, InternalServerError
+
+from config import OPENAI_RATE_LIMITS, OPENAI_DEFAULT_RATE_LIMIT, OPENAI_MAX_RETRIES, OPENAI_REQUEST_DEADLINE_SECONDS
+from instrumentation import METRICS
+from rate_limit import TokenBucket, retry_after_seconds
+
+RETRYABLE_ERRORS = (RateLimitError, APIConnectionError, APITimeoutError, InternalServerError)
+# gpt-4o bills a high-detail image at the 2048x768 preprocessing limit as 6 tiles * 170 + 85 tokens
+IMAGE_TOKENS = 1105
+CHARS_PER_TOKEN = 4
+
+
+class OpenAIDeadlineExceeded(RuntimeError):
+    pass
+
+
+def estimate_request_tokens(kwargs):
+    # Prompt plus the completion cap is what OpenAI counts against the per-minute token limit
+    tokens = 0
+    for message in kwargs.get("messages", []):
+        content = message.get("content")
+        parts = content if isinstance(content, list) else [{"type": "text", "text": content or ""}]
+        for part in parts:
+            tokens += IMAGE_TOKENS if part.get("type") == "image_url" else len(part.get("text", "")) // CHARS_PER_TOKEN + 1
+    return tokens + (kwargs.get("max_tokens") or 0)
+
+
+def request_key(kwargs):
+    return hashlib.sha256(json.dumps(kwargs, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class OpenAIGateway:
+    """Drop-in stand-in for `OpenAI()` chat completions shared by every session.
+
+    Calls wait for a per-model token and request budget, retry rate limits and
+    transient errors with jittered backoff until `deadline_seconds` run out, and
+    identical non-streaming requests already in flight share one upstream call.
+    """
+
+    def __init__(self, client, rate_limits, default_rate_limit, max_retries, deadline_seconds):
+        # Retries happen here, where they can see the shared budget and the caller's deadline
+        self.client = client.with_options(max_retries=0)
+        self.rate_limits = rate_limits
+        self.default_rate_limit = default_rate_limit
+        self.max_retries = max_retries
+        self.deadline_seconds = deadline_seconds
+        self.lock = threading.Lock()
+        self.buckets = {}
+        self.in_flight = {}
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create_chat_completion))
+
+    def bucket(self, model):
+        with self.lock:
+            if model not in self.buckets:
+                self.buckets[model] = TokenBucket(*self.rate_limits.get(model, self.default_rate_limit))
+            return self.buckets[model]
+
+    def create_chat_completion(self, **kwargs):
+        # A stream can only be read once, so streaming requests are never shared
+        if kwargs.get("stream"):
+            return self._create(kwargs)
+
+        key = request_key(kwargs)
+        with self.lock:
+            future = self.in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = self.in_flight[key] = Future()
+        if not leader:
+            METRICS.inc("openai_coalesced_requests_total", model=kwargs.get("model"))
+            return future.result()
+
+        try:
+            response = self._create(kwargs)
+            future.set_result(response)
+            return response
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self.lock:
+                del self.in_flight[key]
+
+    def _create(self, kwargs):
+        model = kwargs.get("model")
+        bucket = self.bucket(model)
+        tokens = estimate_request_tokens(kwargs)
+        deadline = time.monotonic() + self.deadline_seconds
+        for attempt in range(self.max_retries + 1):
+            start = time.monotonic()
+            if not bucket.acquire(tokens, deadline):
+                raise OpenAIDeadlineExceeded(f"No {model} rate limit budget within {self.deadline_seconds}s")
+            METRICS.observe("openai_budget_wait_seconds", time.monotonic() - start, model=model)
+            try:
+                raw = self.client.chat.completions.with_raw_response.create(
+                    **kwargs, timeout=max(1.0, deadline - time.monotonic())
+                )
+            except RETRYABLE_ERRORS as e:
+                response = getattr(e, "response", None)
+                headers = response.headers if response is not None else None
+                bucket.observe_headers(headers)
+                wait = retry_after_seconds(headers, attempt) + random.uniform(0, 1)
+                if attempt == self.max_retries or time.monotonic() + wait > deadline:
+                    raise
+                METRICS.inc("retries_total", stage="openai", reason=type(e).__name__, model=model)
+                if isinstance(e, RateLimitError):
+                    # Every caller of this model backs off, not just this one; acquire() waits out the pause
+                    bucket.pause(wait)
+                else:
+                    time.sleep(wait)
+                continue
+            bucket.observe_headers(raw.headers)
+            return raw.parse()
+
+
+@functools.lru_cache(maxsize=None)
+def get_openai_gateway():
+    return OpenAIGateway(
+        OpenAI(),
+        OPENAI_RATE_LIMITS,
+        OPENAI_DEFAULT_RATE_LIMIT,
+        OPENAI_MAX_RETRIES,
+        OPENAI_REQUEST_DEADLINE_SECONDS,
+    )
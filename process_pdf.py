@@ -1,25 +1,85 @@
 import os
 import time
+import asyncio
 import random  # For adding randomness to backoff
 from dotenv import load_dotenv
-from qdrant_client import QdrantClient
-from qdrant_client.http import models
-from langchain_openai import OpenAIEmbeddings
-from langchain_qdrant import Qdrant
-from langchain_community.document_loaders import PyPDFLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+from openai import AsyncOpenAI
 import streamlit as st
+from config import (
+    COLLECTION_ALIAS,
+    MANIFEST_PATH,
+    EMBEDDING_MODEL,
+    EMBEDDING_SIZE,
+    CHUNK_SIZE,
+    CHUNK_OVERLAP,
+    INGEST_BATCH_SIZE,
+    INGEST_PROCESS_WORKERS,
+    EMBED_CONCURRENCY,
+    UPSERT_CONCURRENCY,
+    EMBED_TOKENS_PER_MINUTE,
+    EMBED_REQUESTS_PER_MINUTE,
+    VECTOR_BACKEND,
+    LOCAL_INDEX_DIR,
+    LOCAL_COMPACT_DELETED_FRACTION,
+    LOCAL_IVF_LISTS,
+    LOCAL_IVF_NPROBE,
+    PDF_BOT_TYPES,
+    SHARED_MANUAL_TAG,
+    PAYLOAD_INDEX_FIELDS,
+    PDF_PAGE_WINDOW,
+    NEAR_DUPLICATE_MAX_DISTANCE,
+    NEAR_DUPLICATE_MIN_CHARS,
+    EMBEDDING_DIMENSIONS,
+    VECTOR_QUANTIZATION,
+    QUANTIZATION_RESCORE,
+    QUANTIZATION_OVERSAMPLING,
+    BINARY_QUANTIZATION_OVERSAMPLING,
+    HNSW_M,
+    HNSW_EF_CONSTRUCT,
+    HNSW_EF_SEARCH,
+)
+from ingest_manifest import (
+    new_manifest,
+    load_manifest,
+    save_manifest,
+    file_sha256,
+    assign_chunk_ids,
+    duplicate_references,
+    dangling_duplicates,
+)
+from ingest_pipeline import IngestJob, embed_texts, run_ingestion
+from rate_limit import TokenBucket
+from vector_backends import QdrantBackend, LocalBackend
+from instrumentation import METRICS
+from embedding_cache import get_embedding_cache, cached_embed_texts, cache_model_key, CachedEmbeddings
+from hybrid_retrieval import BM25Index, HybridRetriever, PdfChain
+from near_duplicates import simhash, SimHashIndex
+from openai_gateway import get_openai_gateway
 
 # Load environment variables
 load_dotenv()
 
+# Passed to the embeddings API only when shortening, so full-size requests stay as before
+EMBEDDING_REQUEST_DIMENSIONS = EMBEDDING_DIMENSIONS if EMBEDDING_DIMENSIONS != EMBEDDING_SIZE else None
+INDEX_SETTINGS = {
+    "dimensions": EMBEDDING_DIMENSIONS,
+    "quantization": VECTOR_QUANTIZATION,
+    "hnsw_m": HNSW_M,
+    "hnsw_ef_construct": HNSW_EF_CONSTRUCT,
+}
+# What collections built before the index layout was recorded hold (Qdrant's own HNSW defaults)
+LEGACY_INDEX_SETTINGS = {"dimensions": EMBEDDING_SIZE, "quantization": "none", "hnsw_m": 16, "hnsw_ef_construct": 100}
+
+# Failures raise rather than return None, so st.cache_resource tries again on the next call
 @st.cache_resource
 def get_qdrant_client():
     qdrant_url = os.getenv("QDRANT_URL")
     qdrant_api_key = os.getenv("QDRANT_API_KEY")
     if not qdrant_url or not qdrant_api_key:
         st.error("QDRANT_URL or QDRANT_API_KEY is not set in the environment variables.")
-        return None
+        raise ValueError("Failed to initialize Qdrant client. Check environment variables and Qdrant settings.")
+    from qdrant_client import QdrantClient
+
     try:
         client = QdrantClient(url=qdrant_url, api_key=qdrant_api_key, timeout=60)  # Set timeout
         collections = client.get_collections()
@@ -27,70 +87,279 @@ def get_qdrant_client():
         return client
     except Exception as e:
         st.error(f"Failed to connect to Qdrant: {str(e)}")
-        return None
+        raise
+
+def rescore_settings(quantization):
+    if quantization == "binary":
+        return True, max(QUANTIZATION_OVERSAMPLING, BINARY_QUANTIZATION_OVERSAMPLING)
+    return QUANTIZATION_RESCORE, QUANTIZATION_OVERSAMPLING
 
 @st.cache_resource
-def process_pdf_folder(pdf_folder):
-    client = get_qdrant_client()
-    if client is None:
-        raise ValueError("Failed to initialize Qdrant client. Check environment variables and Qdrant settings.")
+def get_vector_backend():
+    rescore, oversampling = rescore_settings(VECTOR_QUANTIZATION)
+    if VECTOR_BACKEND == "local":
+        return LocalBackend(
+            LOCAL_INDEX_DIR, VECTOR_QUANTIZATION, rescore, oversampling,
+            LOCAL_COMPACT_DELETED_FRACTION, LOCAL_IVF_LISTS, LOCAL_IVF_NPROBE,
+        )
+    return QdrantBackend(get_qdrant_client(), VECTOR_QUANTIZATION, rescore, oversampling, HNSW_M, HNSW_EF_CONSTRUCT, HNSW_EF_SEARCH)
 
-    collection_name = "Homecarepdf_1731152491"
+def manual_bot_type(file_name):
+    return PDF_BOT_TYPES.get(file_name, SHARED_MANUAL_TAG)
+
+def mark_dangling_duplicates(manifest):
+    # Forget the hash of files whose skipped chunks lost their stored copy, so they are ingested again
+    stale = dangling_duplicates(manifest)
+    for file_name in stale:
+        manifest["files"][file_name]["sha256"] = None
+    return stale
+
+def resolve_collection(backend, manifest, rebuild):
+    collection_name = manifest.get("collection")
+    same_index = manifest.get("index", LEGACY_INDEX_SETTINGS) == INDEX_SETTINGS
+    if collection_name and not same_index:
+        st.write(f"Index settings changed since '{collection_name}' was built; building a new collection")
+    if not rebuild and same_index and collection_name and backend.collection_exists(collection_name):
+        st.write(f"Updating existing collection: {collection_name}")
+        # Collections created before chunks were tagged get their indexes here
+        backend.create_payload_indexes(collection_name, PAYLOAD_INDEX_FIELDS)
+        manifest["index"] = INDEX_SETTINGS
+        return manifest
+
+    # Without a matching manifest we cannot tell what the live collection holds, so build a new version
+    collection_name = f"{COLLECTION_ALIAS}_{int(time.time())}"
     st.write(f"Attempting to create collection with name: {collection_name}")
-    
+    backend.create_collection(collection_name, EMBEDDING_DIMENSIONS)
+    backend.create_payload_indexes(collection_name, PAYLOAD_INDEX_FIELDS)
+    st.write(f"Collection '{collection_name}' created successfully.")
+    manifest = new_manifest(collection_name)
+    manifest["index"] = INDEX_SETTINGS
+    return manifest
+
+def make_upsert_batch(backend, collection_name, max_retries=5):
+    async def upsert_batch(point_ids, vectors, documents):
+        for attempt in range(max_retries):
+            try:
+                await asyncio.to_thread(backend.upsert, collection_name, point_ids, vectors, documents)
+                return
+            except Exception:
+                if attempt == max_retries - 1:
+                    raise
+                METRICS.inc("retries_total", stage="upsert", reason="error")
+                await asyncio.sleep((2 ** attempt) + random.uniform(0, 1))
+    return upsert_batch
+
+@st.cache_resource
+def get_embedding_scheduler():
+    return TokenBucket(EMBED_TOKENS_PER_MINUTE, EMBED_REQUESTS_PER_MINUTE)
+
+@st.cache_resource
+def process_pdf_folder(pdf_folder, rebuild=False):
+    backend = get_vector_backend()
+
     try:
-        client.create_collection(
-            collection_name=collection_name,
-            vectors_config=models.VectorParams(size=1536, distance=models.Distance.COSINE),
-        )
-        st.write(f"Collection '{collection_name}' created successfully.")
+        manifest = resolve_collection(backend, load_manifest(MANIFEST_PATH), rebuild)
     except Exception as e:
-        st.error(f"Failed to create collection '{collection_name}': {str(e)}")
-        return None
-    
+        st.error(f"Failed to prepare collection: {str(e)}")
+        raise
+    collection_name = manifest["collection"]
+    save_manifest(manifest, MANIFEST_PATH)
+
+    from langchain_openai import OpenAIEmbeddings
+
     try:
-        embeddings = OpenAIEmbeddings(model="text-embedding-3-small")
-        vector_store = Qdrant(client=client, collection_name=collection_name, embeddings=embeddings)
+        embeddings = CachedEmbeddings(
+            OpenAIEmbeddings(model=EMBEDDING_MODEL, dimensions=EMBEDDING_REQUEST_DIMENSIONS),
+            get_embedding_cache(),
+            cache_model_key(EMBEDDING_MODEL, EMBEDDING_REQUEST_DIMENSIONS),
+        )
+        vector_store = backend.vector_store(collection_name, embeddings)
     except Exception as e:
         st.error(f"Failed to initialize vector store: {str(e)}")
-        return None
+        raise
+
+    pdf_files = sorted(file_name for file_name in os.listdir(pdf_folder) if file_name.endswith(".pdf"))
+    # Files whose vectors are missing or stale after this run; any of them keeps the alias where it is
+    failed = set()
+    references_before = duplicate_references(manifest)
+
+    # Drop vectors of manuals that were removed from the folder
+    for file_name in sorted(set(manifest["files"]) - set(pdf_files)):
+        try:
+            backend.delete_points(collection_name, list(manifest["files"][file_name]["chunks"]))
+            del manifest["files"][file_name]
+            save_manifest(manifest, MANIFEST_PATH)
+            st.write(f"Removed vectors for deleted file: {file_name}")
+        except Exception as e:
+            failed.add(file_name)
+            st.error(f"Error removing {file_name}: {str(e)}")
 
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-    batch_size = 100
+    for file_name in mark_dangling_duplicates(manifest):
+        st.write(f"Re-ingesting {file_name}: chunks it shared with a removed manual are no longer stored")
 
-    for file_name in os.listdir(pdf_folder):
+    jobs = []
+    for file_name in pdf_files:
         file_path = os.path.join(pdf_folder, file_name)
-        if file_path.endswith(".pdf"):
-            try:
-                st.write(f"Processing file: {file_name}")
-                loader = PyPDFLoader(file_path)
-                documents = loader.load()
-                texts = text_splitter.split_documents(documents)
-
-                for i in range(0, len(texts), batch_size):
-                    batch = texts[i:i+batch_size]
-                    attempt, max_retries, success = 0, 5, False
-                    while attempt < max_retries and not success:
-                        try:
-                            vector_store.add_documents(batch)
-                            st.write(f"Added batch {i//batch_size + 1} for file {file_name}")
-                            success = True
-                        except Exception as e:
-                            st.error(f"Error adding batch for file {file_name}: {str(e)}")
-                            if "quota" in str(e).lower() or "429" in str(e):
-                                wait_time = (2 ** attempt) + random.uniform(0, 1)
-                                st.write(f"Retrying in {wait_time:.2f} seconds...")
-                                time.sleep(wait_time)
-                                attempt += 1
-                            else:
-                                break  # Exit retry loop for non-rate-limit errors
+        try:
+            file_hash = file_sha256(file_path)
+        except Exception as e:
+            failed.add(file_name)
+            st.error(f"Error processing {file_name}: {str(e)}")
+            continue
+        entry = manifest["files"].get(file_name)
+        if entry and entry["sha256"] == file_hash and entry.get("bot_type") == manual_bot_type(file_name):
+            st.write(f"Skipping unchanged file: {file_name}")
+            continue
+        st.write(f"Processing file: {file_name}")
+        jobs.append(IngestJob(file_name, file_path, file_hash, entry))
+
+    # Near-duplicates are only folded within one bot type, so filtered searches still find every chunk.
+    # Manuals that are not re-read this run contribute the fingerprints recorded in the manifest.
+    job_files = {job.file_name for job in jobs}
+    simhash_indexes = {}
+    for file_name, entry in manifest["files"].items():
+        if file_name not in job_files:
+            index = simhash_indexes.setdefault(entry.get("bot_type"), SimHashIndex(NEAR_DUPLICATE_MAX_DISTANCE))
+            for point_id, fingerprint in entry.get("simhashes", {}).items():
+                index.add(int(fingerprint, 16), point_id)
+
+    def prepare_job(job, documents):
+        bot_type = manual_bot_type(job.file_name)
+        # Re-tagged manual: unchanged chunks keep their ids but need the new payload
+        known = job.entry["chunks"] if job.entry and job.entry.get("bot_type") == bot_type else {}
+        index = simhash_indexes.setdefault(bot_type, SimHashIndex(NEAR_DUPLICATE_MAX_DISTANCE))
+        for doc in documents:
+            # The loader's source is a machine-specific path; the file name is what filters and citations use
+            doc.metadata.update(bot_type=bot_type, source=job.file_name)
+        added = []
+        for point_id, (chunk_hash, doc) in assign_chunk_ids(job.file_name, documents, job.occurrences).items():
+            fingerprint = simhash(doc.page_content) if len(doc.page_content) >= NEAR_DUPLICATE_MIN_CHARS else None
+            if fingerprint is not None:
+                original = index.find(fingerprint)
+                if original is not None:
+                    job.duplicates.append([original, doc.metadata.get("page")])
+                    continue
+                index.add(fingerprint, point_id)
+                job.fingerprints[point_id] = f"{fingerprint:016x}"
+            job.chunk_hashes[point_id] = chunk_hash
+            if point_id not in known:
+                job.chunks[point_id] = (chunk_hash, doc)
+                added.append(point_id)
+        return added
+
+    # Only record the new state once every batch landed, so a failed file is retried on the next run
+    def on_job_done(job):
+        job.removed = [point_id for point_id in (job.entry["chunks"] if job.entry else {}) if point_id not in job.chunk_hashes]
+        try:
+            backend.delete_points(collection_name, job.removed)
+        except Exception as e:
+            failed.add(job.file_name)
+            st.error(f"Error removing stale chunks for {job.file_name}: {str(e)}")
+            return
+        manifest["files"][job.file_name] = {
+            "sha256": job.file_hash,
+            "bot_type": manual_bot_type(job.file_name),
+            "chunks": job.chunk_hashes,
+            "simhashes": job.fingerprints,
+            "duplicates": job.duplicates,
+        }
+        save_manifest(manifest, MANIFEST_PATH)
+        st.write(
+            f"Finished file: {job.file_name} ({len(job.chunk_hashes)} chunks stored, "
+            f"{len(job.duplicates)} near-duplicates skipped, {len(job.removed)} removed)"
+        )
+
+    if jobs:
+        openai_client = AsyncOpenAI()
+        scheduler = get_embedding_scheduler()
+        cache = get_embedding_cache()
 
+        async def embed_uncached(texts):
+            return await embed_texts(openai_client, EMBEDDING_MODEL, texts, scheduler, dimensions=EMBEDDING_REQUEST_DIMENSIONS)
+
+        def embed_batch(texts):
+            return cached_embed_texts(cache, cache_model_key(EMBEDDING_MODEL, EMBEDDING_REQUEST_DIMENSIONS), texts, embed_uncached)
+
+        asyncio.run(run_ingestion(
+            jobs,
+            prepare_job,
+            embed_batch,
+            make_upsert_batch(backend, collection_name),
+            scheduler,
+            on_job_done,
+            chunk_size=CHUNK_SIZE,
+            chunk_overlap=CHUNK_OVERLAP,
+            max_batch_size=INGEST_BATCH_SIZE,
+            process_workers=INGEST_PROCESS_WORKERS,
+            embed_concurrency=EMBED_CONCURRENCY,
+            upsert_concurrency=UPSERT_CONCURRENCY,
+            page_window=PDF_PAGE_WINDOW,
+            log=st.write,
+        ))
+        for job in jobs:
+            if job.error is not None:
+                failed.add(job.file_name)
+                st.error(f"Skipping manifest update for {job.file_name}; it will be retried on the next run.")
+
+        # A chunk this run removed, or one from a file that failed, may be what another file deferred to
+        stale = mark_dangling_duplicates(manifest)
+        save_manifest(manifest, MANIFEST_PATH)
+        failed.update(stale)
+        for file_name in stale:
+            st.warning(f"{file_name} refers to chunks that are no longer stored; it will be re-ingested on the next run.")
+
+    # Each stored chunk lists where its skipped near-duplicates appeared; refresh the lists that changed
+    # and those of chunks that were just (re)written without them
+    references_after = duplicate_references(manifest)
+    stored_by = {point_id: file_name for file_name, entry in manifest["files"].items() for point_id in entry["chunks"]}
+    for point_id in sorted(set(references_before) | set(references_after)):
+        if point_id not in stored_by:
+            continue
+        if references_before.get(point_id) != references_after.get(point_id) or stored_by[point_id] in job_files:
+            try:
+                backend.update_metadata(collection_name, point_id, {"duplicates": references_after.get(point_id, [])})
             except Exception as e:
-                st.error(f"Error processing {file_name}: {str(e)}")
-    
-    st.success(f"All PDFs processed successfully! Created collection: {collection_name}")
+                st.error(f"Error updating duplicate references on {point_id}: {str(e)}")
+
+    # Re-ingested and re-tagged manuals leave deleted rows behind in the local store
+    try:
+        if backend.maintain(collection_name):
+            st.write(f"Compacted collection '{collection_name}'.")
+    except Exception as e:
+        st.error(f"Failed to compact or index '{collection_name}': {str(e)}")
+
+    if failed:
+        # The next run carries on filling this collection and only then switches users over to it
+        live_collection = backend.get_alias_target(COLLECTION_ALIAS)
+        st.warning(
+            f"{len(failed)} file(s) were not fully ingested ({', '.join(sorted(failed))}); "
+            f"alias '{COLLECTION_ALIAS}' left on '{live_collection}'. Run again to retry them."
+        )
+        if live_collection and live_collection != collection_name and backend.collection_exists(live_collection):
+            return backend.vector_store(live_collection, embeddings), live_collection
+        return vector_store, collection_name
+
+    # Older versions are left in place so a bad rebuild can be rolled back by re-pointing the alias
+    try:
+        if backend.get_alias_target(COLLECTION_ALIAS) != collection_name:
+            backend.point_alias_to(COLLECTION_ALIAS, collection_name)
+            st.write(f"Alias '{COLLECTION_ALIAS}' now points to '{collection_name}'.")
+    except Exception as e:
+        st.error(f"Failed to update alias '{COLLECTION_ALIAS}': {str(e)}")
+
+    st.success(f"All PDFs processed successfully! Using collection: {collection_name}")
     return vector_store, collection_name
 
+@st.cache_resource
+def get_pdf_chain(pdf_folder):
+    # BM25 is built from what the collection holds once ingestion for this process has finished
+    vector_store, collection_name = process_pdf_folder(pdf_folder)
+    backend = get_vector_backend()
+    bm25_index = BM25Index(backend.iter_documents(collection_name))
+    st.write(f"Keyword index built over {len(bm25_index)} chunks.")
+    retriever = HybridRetriever(vector_store, bm25_index, backend.metadata_filter, search_kwargs=backend.search_kwargs())
+    return PdfChain(get_openai_gateway(), retriever)
+
 # # Usage example
 # pdf_folder_path = "/Users/hemantgoyal/Downloads/Freelancing/Active Clients/Roshan/Home owner Helper/pdf"
 # process_pdf_folder(pdf_folder_path)
@@ -0,0 +1,121 @@
+import asyncio
+import re
+import threading
+import time
+
+DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+DURATION_SECONDS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+def parse_duration(value):
+    # OpenAI reset headers look like "20ms", "6s" or "1m30.5s"
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = DURATION_PART.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * DURATION_SECONDS[unit] for amount, unit in parts)
+
+
+def parse_int(value):
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def retry_after_seconds(headers, attempt, base=1.0, cap=60.0):
+    if headers is not None:
+        for name in ("retry-after-ms", "retry-after"):
+            seconds = parse_duration(headers.get(name))
+            if seconds is not None:
+                return min(seconds / 1000 if name == "retry-after-ms" else seconds, cap)
+    return min(base * (2 ** attempt), cap)
+
+
+class TokenBucket:
+    """Token and request budget shared by every caller in the process.
+
+    Starts from configured per-minute limits and corrects itself from the
+    x-ratelimit-* headers returned by the API.
+    """
+
+    def __init__(self, tokens_per_minute, requests_per_minute):
+        self.lock = threading.Lock()
+        self.token_capacity = float(tokens_per_minute)
+        self.request_capacity = float(requests_per_minute)
+        self.tokens = self.token_capacity
+        self.requests = self.request_capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def _refill(self, now):
+        elapsed = now - self.updated
+        self.updated = now
+        self.tokens = min(self.token_capacity, self.tokens + elapsed * self.token_capacity / 60)
+        self.requests = min(self.request_capacity, self.requests + elapsed * self.request_capacity / 60)
+
+    def try_acquire(self, tokens):
+        # Returns 0 when the budget was taken, otherwise the number of seconds to wait before retrying
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            if now < self.paused_until:
+                return self.paused_until - now
+            tokens = min(tokens, self.token_capacity)
+            if self.tokens >= tokens and self.requests >= 1:
+                self.tokens -= tokens
+                self.requests -= 1
+                return 0.0
+            token_wait = (tokens - self.tokens) * 60 / self.token_capacity if self.tokens < tokens else 0.0
+            request_wait = (1 - self.requests) * 60 / self.request_capacity if self.requests < 1 else 0.0
+            return max(token_wait, request_wait, 0.001)
+
+    def acquire(self, tokens, deadline=None):
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait == 0:
+                return True
+            if deadline is not None and time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+    async def acquire_async(self, tokens):
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait == 0:
+                return
+            await asyncio.sleep(wait)
+
+    def pause(self, seconds):
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def observe_headers(self, headers):
+        if headers is None:
+            return
+        limit_tokens = parse_int(headers.get("x-ratelimit-limit-tokens"))
+        limit_requests = parse_int(headers.get("x-ratelimit-limit-requests"))
+        remaining_tokens = parse_int(headers.get("x-ratelimit-remaining-tokens"))
+        remaining_requests = parse_int(headers.get("x-ratelimit-remaining-requests"))
+        with self.lock:
+            self._refill(time.monotonic())
+            if limit_tokens:
+                self.token_capacity = float(limit_tokens)
+            if limit_requests:
+                self.request_capacity = float(limit_requests)
+            # The server's view wins when it is stricter than ours
+            if remaining_tokens is not None:
+                self.tokens = min(self.tokens, float(remaining_tokens))
+            if remaining_requests is not None:
+                self.requests = min(self.requests, float(remaining_requests))
+
+    def request_token_budget(self, concurrency):
+        # Size requests so that `concurrency` of them fit in one minute's budget at once
+        with self.lock:
+            return max(1, int(self.token_capacity / max(1, concurrency)))
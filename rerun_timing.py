@@ -0,0 +1,80 @@
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+PROCESS_START = time.perf_counter()
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class RerunTimings:
+    """Process-wide record of cold-start phases and the per-phase cost of recent reruns."""
+
+    def __init__(self, budget_ms, window=200):
+        self.budget_ms = budget_ms
+        self.lock = threading.Lock()
+        self.cold_start = {}
+        self.reruns = deque(maxlen=window)
+
+    def record_cold_start(self, phase, seconds):
+        with self.lock:
+            self.cold_start.setdefault(phase, seconds * 1000)
+
+    def record_rerun(self, phases, external=None):
+        # Only time spent in the script counts against the budget; waits on OpenAI are kept alongside
+        total = sum(phases.values())
+        external = {f"{name}_external": ms for name, ms in (external or {}).items()}
+        with self.lock:
+            self.reruns.append(dict(phases, total=total, **external))
+        if total > self.budget_ms:
+            logger.warning("Rerun took %.1f ms (budget %.1f ms): %s", total, self.budget_ms, phases)
+
+    def summary(self):
+        with self.lock:
+            reruns = list(self.reruns)
+            cold_start = dict(self.cold_start)
+        phases = sorted({phase for rerun in reruns for phase in rerun})
+        return {
+            "cold_start_ms": cold_start,
+            "reruns": len(reruns),
+            "budget_ms": self.budget_ms,
+            "p50_ms": {phase: percentile([r[phase] for r in reruns if phase in r], 0.5) for phase in phases},
+            "p95_ms": {phase: percentile([r[phase] for r in reruns if phase in r], 0.95) for phase in phases},
+        }
+
+
+class RerunTimer:
+    def __init__(self):
+        self.phases = {}
+        self.external = {}
+        self.external_total = 0.0
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        external_before = self.external_total
+        try:
+            yield
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000 - (self.external_total - external_before)
+            self.phases[name] = self.phases.get(name, 0.0) + elapsed
+
+    @contextmanager
+    def external_call(self, name):
+        # Model calls and ingestion made inside a phase are subtracted from it, so the phase measures rendering only
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            self.external[name] = self.external.get(name, 0.0) + elapsed
+            self.external_total += elapsed
@@ -0,0 +1,92 @@
+import pytest
+
+import answer_cache
+from answer_cache import AnswerCache, is_context_free, normalize_question
+
+NAMESPACE = ("Plumbing and Water Systems", "general")
+VECTORS = {
+    "how do i fix a leaky faucet": [1.0, 0.0, 0.0],
+    "my faucet is leaking what do i do": [0.95, 0.31, 0.0],
+    "why is my water heater noisy": [0.0, 1.0, 0.0],
+    "how do i unclog a drain": [0.0, 0.0, 1.0],
+}
+
+
+def embed_query(question):
+    return VECTORS[normalize_question(question)]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(answer_cache.time, "time", lambda: now[0])
+    return now
+
+
+def make_cache(**kwargs):
+    options = dict(default_threshold=0.9, ttl_seconds=60, max_entries=10)
+    options.update(kwargs)
+    return AnswerCache(embed_query, **options)
+
+
+def test_exact_match_ignores_case_and_punctuation(clock):
+    cache = make_cache()
+    cache.store(NAMESPACE, "How do I fix a leaky faucet?", "Replace the washer.")
+    assert cache.lookup(NAMESPACE, "how do i fix a leaky FAUCET")[0] == "Replace the washer."
+    assert cache.stats()["exact_hits"] == 1
+
+
+def test_similar_questions_hit_above_the_threshold_only(clock):
+    cache = make_cache()
+    cache.store(NAMESPACE, "How do I fix a leaky faucet?", "Replace the washer.")
+    assert cache.lookup(NAMESPACE, "My faucet is leaking, what do I do?")[0] == "Replace the washer."
+    assert cache.lookup(NAMESPACE, "Why is my water heater noisy?")[0] is None
+    assert make_cache(default_threshold=0.99).lookup(NAMESPACE, "My faucet is leaking, what do I do?")[0] is None
+
+
+def test_per_bot_thresholds_override_the_default(clock):
+    cache = make_cache(thresholds={NAMESPACE[0]: 0.99})
+    cache.store(NAMESPACE, "How do I fix a leaky faucet?", "Replace the washer.")
+    assert cache.lookup(NAMESPACE, "My faucet is leaking, what do I do?")[0] is None
+
+
+def test_namespaces_are_separate(clock):
+    cache = make_cache()
+    cache.store(NAMESPACE, "How do I fix a leaky faucet?", "Replace the washer.")
+    assert cache.lookup(("HVAC (Heating, Ventilation, and Air Conditioning)", "general"), "How do I fix a leaky faucet?")[0] is None
+
+
+def test_entries_expire_after_the_ttl(clock):
+    cache = make_cache(ttl_seconds=60)
+    cache.store(NAMESPACE, "How do I fix a leaky faucet?", "Replace the washer.")
+    clock[0] += 61
+    assert cache.lookup(NAMESPACE, "How do I fix a leaky faucet?")[0] is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_least_recently_used_entry_is_dropped(clock):
+    cache = make_cache(max_entries=2)
+    cache.store(NAMESPACE, "How do I fix a leaky faucet?", "Replace the washer.")
+    cache.store(NAMESPACE, "Why is my water heater noisy?", "Flush the sediment.")
+    cache.lookup(NAMESPACE, "How do I fix a leaky faucet?")
+    cache.store(NAMESPACE, "How do I unclog a drain?", "Use a plunger.")
+    assert cache.lookup(NAMESPACE, "Why is my water heater noisy?")[0] is None
+    assert cache.lookup(NAMESPACE, "How do I fix a leaky faucet?")[0] == "Replace the washer."
+
+
+def test_embedding_failures_fall_back_to_exact_matches(clock):
+    def failing(question):
+        raise ConnectionError("embeddings unavailable")
+
+    cache = AnswerCache(failing, 0.9, 60, 10)
+    cache.store(NAMESPACE, "How do I fix a leaky faucet?", "Replace the washer.")
+    assert cache.lookup(NAMESPACE, "How do I fix a leaky faucet?")[0] == "Replace the washer."
+    assert cache.lookup(NAMESPACE, "My faucet is leaking, what do I do?") == (None, None)
+
+
+def test_only_questions_without_history_are_cacheable():
+    assert is_context_free("How do I fix a leaky faucet?", [])
+    # The interface has already appended the question itself
+    assert is_context_free("How do I fix a leaky faucet?", [{"role": "user", "content": "How do I fix a leaky faucet?"}])
+    history = [{"role": "user", "content": "My kitchen faucet drips"}, {"role": "assistant", "content": "Which model?"}]
+    assert not is_context_free("How do I fix it?", history)
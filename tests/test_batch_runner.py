@@ -0,0 +1,58 @@
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+from openai import APIConnectionError, BadRequestError, InternalServerError
+
+import batch_runner
+
+REQUEST = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+RECORD = {"id": 1, "bot_type": "Pest and Bug Control", "question": "How do I get rid of ants?"}
+
+
+class FlakyCompletions:
+    def __init__(self, errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        message = SimpleNamespace(content=" Use bait stations. ")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+
+def client_for(completions):
+    return SimpleNamespace(chat=SimpleNamespace(completions=completions))
+
+
+def no_sleep(monkeypatch):
+    async def sleep(seconds):
+        pass
+
+    monkeypatch.setattr(batch_runner.asyncio, "sleep", sleep)
+
+
+def test_transient_errors_are_retried(monkeypatch):
+    no_sleep(monkeypatch)
+    server_error = InternalServerError("boom", response=httpx.Response(500, request=REQUEST), body=None)
+    completions = FlakyCompletions([APIConnectionError(request=REQUEST), server_error])
+    result = asyncio.run(batch_runner.answer_record(client_for(completions), RECORD, "gpt-4o-mini", 100))
+    assert result["answer"] == "Use bait stations."
+    assert result["retries"] == 2
+
+
+def test_client_errors_fail_the_record_at_once(monkeypatch):
+    no_sleep(monkeypatch)
+    bad_request = BadRequestError("bad", response=httpx.Response(400, request=REQUEST), body=None)
+    completions = FlakyCompletions([bad_request])
+    result = asyncio.run(batch_runner.answer_record(client_for(completions), RECORD, "gpt-4o-mini", 100))
+    assert "error" in result and completions.calls == 1
+
+
+def test_retries_are_bounded(monkeypatch):
+    no_sleep(monkeypatch)
+    completions = FlakyCompletions([APIConnectionError(request=REQUEST)] * 5)
+    result = asyncio.run(batch_runner.answer_record(client_for(completions), RECORD, "gpt-4o-mini", 100, max_retries=3))
+    assert "error" in result and completions.calls == 3
@@ -0,0 +1,51 @@
+from context_builder import build_context, fit_history, message_tokens, new_summary
+
+
+def turns(count, words=40):
+    return [
+        {"role": "user" if i % 2 == 0 else "assistant", "content": f"turn {i} " + "word " * words}
+        for i in range(count)
+    ]
+
+
+def test_short_history_is_kept_whole():
+    history = turns(4)
+    kept, summary = fit_history(history, 10000, new_summary())
+    assert kept == history
+    assert summary == new_summary()
+
+
+def test_overflow_folds_oldest_turns_into_the_summary():
+    history = turns(20)
+    folded = []
+
+    def summarize(previous, messages):
+        folded.extend(messages)
+        return "summary"
+
+    budget = 600
+    kept, summary = fit_history(history, budget, new_summary(), summarize)
+    assert summary["text"] == "summary"
+    assert folded == history[:summary["covered"]]
+    assert kept == history[len(history) - len(kept):]
+    assert sum(message_tokens(message) for message in kept) <= budget
+
+
+def test_failed_summary_leaves_turns_unfolded():
+    history = turns(20)
+
+    def summarize(previous, messages):
+        raise RuntimeError("summary unavailable")
+
+    kept, summary = fit_history(history, 600, new_summary(), summarize)
+    assert summary == new_summary()
+    assert kept and kept[-1] == history[-1]
+
+
+def test_build_context_keeps_the_prefix_fixed():
+    summary = {"text": "Earlier the user described a leak.", "covered": 0}
+    messages = build_context("system", "assistant", turns(2), "question?", 10000, summary=summary)
+    assert messages[0] == {"role": "system", "content": "system"}
+    assert messages[1] == {"role": "assistant", "content": "assistant"}
+    assert "leak" in messages[2]["content"]
+    assert messages[-1] == {"role": "user", "content": "question?"}
@@ -0,0 +1,55 @@
+import threading
+
+from conversation_store import InMemoryConversationStore, SQLiteConversationStore, load_window, stored_summary, trim_window
+
+
+def messages(count):
+    return [{"role": "user", "content": str(i)} for i in range(count)]
+
+
+def test_trim_window_only_drops_summarized_messages():
+    summary = {"text": "s", "covered": 3}
+    window, start = trim_window(messages(10), 0, summary, window=5)
+    assert [m["content"] for m in window] == [str(i) for i in range(3, 10)]
+    assert start == 3
+    assert summary["covered"] == 0
+
+
+def test_trim_window_keeps_short_windows():
+    summary = {"text": "s", "covered": 2}
+    window, start = trim_window(messages(4), 6, summary, window=5)
+    assert len(window) == 4 and start == 6 and summary["covered"] == 2
+
+
+def test_stored_summary_is_relative_to_the_whole_conversation():
+    assert stored_summary({"text": "s", "covered": 2}, 6) == {"text": "s", "covered": 8}
+
+
+def test_load_window_round_trips_a_trimmed_window():
+    store = InMemoryConversationStore()
+    session_id = store.create_session("bot")
+    for i in range(10):
+        store.append_message(session_id, "user", str(i))
+    store.save_summary(session_id, {"text": "s", "covered": 7})
+    window, start, summary = load_window(store, session_id, window=5)
+    assert start == 5
+    assert [m["content"] for m in window] == [str(i) for i in range(5, 10)]
+    assert summary["covered"] == 2
+
+
+def test_sqlite_store_numbers_concurrent_appends(tmp_path):
+    store = SQLiteConversationStore(str(tmp_path / "conversations.sqlite3"))
+    session_id = store.create_session("bot")
+
+    def append():
+        for _ in range(50):
+            store.append_message(session_id, "user", "hi")
+
+    threads = [threading.Thread(target=append) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert store.count_messages(session_id) == 200
+    assert store.count_messages(session_id, role="user") == 200
+    assert len(store.load_messages(session_id)) == 200
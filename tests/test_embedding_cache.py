@@ -0,0 +1,65 @@
+import pytest
+
+import embedding_cache
+from embedding_cache import CachedEmbeddings, EmbeddingCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(embedding_cache.time, "time", lambda: now[0])
+    return now
+
+
+class CountingEmbeddings:
+    def __init__(self):
+        self.calls = []
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        return [[float(len(text)), 1.0] for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def test_vectors_round_trip_per_model(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite3"), 10)
+    cache.put_many("small", ["a"], [[0.5, -1.0]])
+    assert cache.get_many("small", ["a", "b"]) == [[0.5, -1.0], None]
+    assert cache.get_many("large", ["a"]) == [None]
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, clock):
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite3"), 2)
+    cache.put_many("m", ["a", "b"], [[1.0], [2.0]])
+    clock[0] += 1
+    cache.get_many("m", ["a"])
+    clock[0] += 1
+    cache.put_many("m", ["c"], [[3.0]])
+    assert cache.get_many("m", ["a", "b", "c"]) == [[1.0], None, [3.0]]
+
+
+def test_overwriting_a_key_does_not_evict(tmp_path, clock):
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite3"), 2)
+    cache.put_many("m", ["a", "b"], [[1.0], [2.0]])
+    cache.put_many("m", ["a"], [[1.5]])
+    assert cache.get_many("m", ["a", "b"]) == [[1.5], [2.0]]
+
+
+def test_size_survives_reopening(tmp_path, clock):
+    path = str(tmp_path / "cache.sqlite3")
+    EmbeddingCache(path, 2).put_many("m", ["a", "b"], [[1.0], [2.0]])
+    reopened = EmbeddingCache(path, 2)
+    reopened.put_many("m", ["c"], [[3.0]])
+    assert reopened.get_many("m", ["a", "b", "c"]).count(None) == 1
+
+
+def test_cached_embeddings_only_embed_misses_once(tmp_path):
+    inner = CountingEmbeddings()
+    embeddings = CachedEmbeddings(inner, EmbeddingCache(str(tmp_path / "cache.sqlite3"), 10), "m")
+    assert embeddings.embed_documents(["ab", "ab", "c"]) == [[2.0, 1.0], [2.0, 1.0], [1.0, 1.0]]
+    assert embeddings.embed_documents(["c", "def"]) == [[1.0, 1.0], [3.0, 1.0]]
+    assert embeddings.embed_query("ab") == [2.0, 1.0]
+    assert inner.calls == [["ab", "c"], ["def"]]
+
@@ -0,0 +1,36 @@
+from langchain_core.documents import Document
+
+from hybrid_retrieval import BM25Index, reciprocal_rank_fusion, tokenize
+
+
+def doc(point_id, text="", **metadata):
+    return Document(id=point_id, page_content=text, metadata=metadata)
+
+
+def test_rrf_prefers_documents_ranked_well_in_both_lists():
+    a, b, c = doc("a"), doc("b"), doc("c")
+    fused = reciprocal_rank_fusion([[a, b, c], [b, c, a]], k=3)
+    assert [d.id for d in fused] == ["b", "a", "c"]
+
+
+def test_rrf_deduplicates_and_truncates():
+    a, b = doc("a"), doc("b")
+    fused = reciprocal_rank_fusion([[a], [a, b]], k=1)
+    assert [d.id for d in fused] == ["a"]
+
+
+def test_tokenize_keeps_codes_in_both_spellings():
+    tokens = tokenize("Error F5.1 on WDT-780")
+    assert {"f5", "1", "f51", "wdt", "780", "wdt780"} <= set(tokens)
+
+
+def test_bm25_finds_exact_codes_and_applies_filters():
+    documents = [
+        doc("1", "Error E21 means the drain is blocked", bot_type="appliance"),
+        doc("2", "Clean the gutters every spring", bot_type="roofing"),
+        doc("3", "Error E21 on the furnace means a sensor fault", bot_type="hvac"),
+    ]
+    index = BM25Index(documents)
+    assert index.search("what is E21", k=1)[0][0].id in {"1", "3"}
+    filtered = index.search("what is E21", k=5, filter={"bot_type": ["hvac"]})
+    assert [d.id for d, _ in filtered] == ["3"]
@@ -0,0 +1,56 @@
+from io import BytesIO
+
+from PIL import Image
+
+from config import IMAGE_MAX_LONG_SIDE, IMAGE_MAX_SHORT_SIDE
+from image_processing import image_sha256, preprocess_image
+
+EXIF_ORIENTATION = 0x0112
+
+
+def encode(image, format="JPEG", **options):
+    buffered = BytesIO()
+    image.save(buffered, format=format, **options)
+    return buffered.getvalue()
+
+
+def decode(image_bytes):
+    return Image.open(BytesIO(image_bytes))
+
+
+def test_large_photos_fit_the_vision_limits():
+    image_bytes, mime_type = preprocess_image(encode(Image.new("RGB", (4032, 3024), "gray")))
+    image = decode(image_bytes)
+    assert mime_type == "image/jpeg" and image.format == "JPEG"
+    assert max(image.size) <= IMAGE_MAX_LONG_SIDE and min(image.size) <= IMAGE_MAX_SHORT_SIDE
+    assert image.size == (1024, 768)
+
+
+def test_small_images_keep_their_size():
+    image = decode(preprocess_image(encode(Image.new("RGB", (640, 480), "gray")))[0])
+    assert image.size == (640, 480)
+
+
+def test_exif_is_applied_and_stripped():
+    # Orientation 6: the camera stored the pixels on their side
+    exif = Image.Exif()
+    exif[EXIF_ORIENTATION] = 6
+    exif[0x010F] = "PhoneMaker"
+    image = decode(preprocess_image(encode(Image.new("RGB", (800, 600), "gray"), exif=exif.tobytes()))[0])
+    assert image.size == (600, 800)
+    assert not image.getexif()
+
+
+def test_transparent_images_stay_png():
+    image_bytes, mime_type = preprocess_image(encode(Image.new("RGBA", (300, 200), (255, 0, 0, 0)), format="PNG"))
+    assert mime_type == "image/png" and decode(image_bytes).mode == "RGBA"
+
+
+def test_opaque_png_is_sent_as_jpeg():
+    assert preprocess_image(encode(Image.new("RGB", (300, 200), "gray"), format="PNG"))[1] == "image/jpeg"
+
+
+def test_hash_identifies_identical_uploads():
+    upload = encode(Image.new("RGB", (10, 10), "gray"))
+    assert image_sha256(upload) == image_sha256(bytes(upload))
+    assert image_sha256(upload) != image_sha256(upload + b"\0")
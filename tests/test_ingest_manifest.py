@@ -0,0 +1,37 @@
+from langchain_core.documents import Document
+
+from ingest_manifest import assign_chunk_ids, chunk_sha256
+
+
+def doc(text, page=0):
+    return Document(page_content=text, metadata={"page": page})
+
+
+def test_ids_are_stable_across_runs():
+    documents = [doc("first chunk"), doc("second chunk", page=1)]
+    assert list(assign_chunk_ids("a.pdf", documents)) == list(assign_chunk_ids("a.pdf", documents))
+
+
+def test_ids_depend_on_file_name():
+    documents = [doc("same text")]
+    assert set(assign_chunk_ids("a.pdf", documents)).isdisjoint(assign_chunk_ids("b.pdf", documents))
+
+
+def test_repeated_chunks_get_distinct_ids():
+    chunks = assign_chunk_ids("a.pdf", [doc("warranty"), doc("warranty")])
+    assert len(chunks) == 2
+    assert {chunk_hash for chunk_hash, _ in chunks.values()} == {chunk_sha256("warranty", 0)}
+
+
+def test_page_is_part_of_the_hash():
+    assert chunk_sha256("text", 0) != chunk_sha256("text", 1)
+
+
+def test_occurrences_carry_over_between_page_windows():
+    documents = [doc("warranty"), doc("warranty")]
+    whole = assign_chunk_ids("a.pdf", documents)
+    occurrences = {}
+    windowed = {}
+    for document in documents:
+        windowed.update(assign_chunk_ids("a.pdf", [document], occurrences))
+    assert list(windowed) == list(whole)
@@ -0,0 +1,117 @@
+import asyncio
+
+import pytest
+from pypdf import PdfWriter
+from pypdf.generic import DecodedStreamObject, DictionaryObject, NameObject
+
+from ingest_manifest import assign_chunk_ids
+from ingest_pipeline import IngestJob, run_ingestion
+from rate_limit import TokenBucket
+
+
+def write_pdf(path, pages):
+    writer = PdfWriter()
+    font = DictionaryObject({
+        NameObject("/Type"): NameObject("/Font"),
+        NameObject("/Subtype"): NameObject("/Type1"),
+        NameObject("/BaseFont"): NameObject("/Helvetica"),
+    })
+    for text in pages:
+        page = writer.add_blank_page(612, 792)
+        page[NameObject("/Resources")] = DictionaryObject({
+            NameObject("/Font"): DictionaryObject({NameObject("/F1"): writer._add_object(font)})
+        })
+        stream = DecodedStreamObject()
+        stream.set_data(f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET".encode())
+        page[NameObject("/Contents")] = writer._add_object(stream)
+    with open(path, "wb") as f:
+        writer.write(f)
+    return str(path)
+
+
+@pytest.fixture(scope="module")
+def manuals(tmp_path_factory):
+    folder = tmp_path_factory.mktemp("pdf")
+    return [
+        write_pdf(folder / f"{name}.pdf", [f"{name} page {page} text" for page in range(3)])
+        for name in ("washer", "furnace")
+    ]
+
+
+def ingest(paths, embed_batch=None, upsert_batch=None, on_job_done=None):
+    jobs = [IngestJob(path.rsplit("/", 1)[-1], path, "hash", None) for path in paths]
+    stored, done = [], []
+
+    def prepare_job(job, documents):
+        chunks = assign_chunk_ids(job.file_name, documents, job.occurrences)
+        job.chunks.update(chunks)
+        return list(chunks)
+
+    async def embed(texts):
+        return [[1.0, 0.0] for _ in texts]
+
+    async def upsert(point_ids, vectors, documents):
+        stored.extend(point_ids)
+
+    async def run():
+        await run_ingestion(
+            jobs,
+            prepare_job,
+            embed_batch or embed,
+            upsert_batch or upsert,
+            TokenBucket(1000000, 10000),
+            on_job_done or done.append,
+            chunk_size=1000,
+            chunk_overlap=0,
+            max_batch_size=2,
+            process_workers=1,
+            page_window=2,
+            log=lambda message: None,
+        )
+
+    # A stuck queue would otherwise hang the test run
+    asyncio.run(asyncio.wait_for(run(), timeout=60))
+    return jobs, stored, done
+
+
+def test_every_page_is_stored_and_reported(manuals):
+    jobs, stored, done = ingest(manuals)
+    assert len(stored) == 6
+    assert done == jobs
+    assert all(job.error is None and not job.chunks for job in jobs)
+
+
+def test_failing_on_job_done_marks_the_job_instead_of_hanging(manuals):
+    def on_job_done(job):
+        raise OSError("disk full")
+
+    jobs, stored, _ = ingest(manuals, on_job_done=on_job_done)
+    assert len(stored) == 6
+    assert all(isinstance(job.error, OSError) for job in jobs)
+
+
+def test_embedding_failure_only_fails_its_file(manuals):
+    async def embed(texts):
+        if any("washer" in text for text in texts):
+            raise RuntimeError("bad request")
+        return [[1.0, 0.0] for _ in texts]
+
+    jobs, _, done = ingest(manuals, embed_batch=embed)
+    assert isinstance(jobs[0].error, RuntimeError)
+    assert done == [jobs[1]]
+
+
+def test_upsert_failure_is_not_reported_as_done(manuals):
+    async def upsert(point_ids, vectors, documents):
+        raise ConnectionError("vector store unavailable")
+
+    jobs, _, done = ingest(manuals, upsert_batch=upsert)
+    assert all(isinstance(job.error, ConnectionError) for job in jobs)
+    assert done == []
+
+
+def test_unreadable_file_is_reported(manuals, tmp_path):
+    missing = str(tmp_path / "missing.pdf")
+    jobs, _, done = ingest([missing, manuals[1]])
+    assert jobs[0].error is not None
+    assert done == [jobs[1]]
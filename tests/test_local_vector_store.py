@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from local_vector_store import LocalVectorStore
+
+
+def store_with_vectors(path, count=200, dim=16, quantization="none"):
+    vectors = np.random.default_rng(0).standard_normal((count, dim)).astype(np.float32)
+    store = LocalVectorStore(str(path), dim=dim, quantization=quantization)
+    store.add_embeddings([f"t{i}" for i in range(count)], vectors, [{"i": i} for i in range(count)], [f"p{i}" for i in range(count)])
+    return store, vectors
+
+
+def test_compact_drops_deleted_rows_and_survives_reopening(tmp_path):
+    store, vectors = store_with_vectors(tmp_path)
+    store.delete([f"p{i}" for i in range(0, 200, 2)])
+    store.compact()
+    assert len(store) == store.count == 100
+    reopened = LocalVectorStore(str(tmp_path))
+    best = reopened.similarity_search_by_vector(vectors[7], k=1)[0]
+    assert best.id == "p7" and best.metadata == {"i": 7}
+
+
+def test_failed_compact_leaves_the_index_intact(tmp_path, monkeypatch):
+    store, vectors = store_with_vectors(tmp_path)
+    store.delete(["p0", "p1"])
+
+    def fail(key, value):
+        raise RuntimeError("disk full")
+
+    monkeypatch.setattr(store, "_set_info", fail)
+    with pytest.raises(RuntimeError):
+        store.compact()
+    reopened = LocalVectorStore(str(tmp_path))
+    assert len(reopened) == 198
+    assert reopened.similarity_search_by_vector(vectors[5], k=1)[0].id == "p5"
+
+
+def test_scalar_range_is_refitted_when_a_batch_exceeds_it(tmp_path):
+    store, _ = store_with_vectors(tmp_path, count=10, quantization="scalar")
+    first_scale = store.scale
+    wide = np.zeros((1, 16), dtype=np.float32)
+    wide[0, 0] = 1.0
+    store.add_embeddings(["wide"], wide, None, ["wide"])
+    assert store.scale < first_scale
+    assert store.codes[store.rows_by_id["wide"], 0] == 127
+    assert store.scale == LocalVectorStore(str(tmp_path)).scale
+    assert store.similarity_search_by_vector(wide[0], k=1, rescore=False)[0].id == "wide"
+
+
+def test_batches_within_the_range_keep_the_scale(tmp_path):
+    store, vectors = store_with_vectors(tmp_path, count=10, quantization="scalar")
+    first_scale = store.scale
+    store.add_embeddings(["again"], vectors[:1] * 0.5, None, ["again"])
+    assert store.scale == first_scale
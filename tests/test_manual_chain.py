@@ -0,0 +1,30 @@
+from streamlit.testing.v1 import AppTest
+
+
+def load_manuals_twice():
+    import streamlit as st
+
+    import chatbot_interface
+    import process_pdf
+
+    def unreachable():
+        raise ValueError("Failed to connect to Qdrant")
+
+    # The script shares the test process, so every patch is undone before it returns
+    pdf_folder, get_vector_backend = chatbot_interface.PDF_FOLDER, process_pdf.get_vector_backend
+    chatbot_interface.PDF_FOLDER = "pdf"
+    process_pdf.get_vector_backend = unreachable
+    try:
+        st.write(f"first={chatbot_interface.get_manual_chain()}")
+        st.write(f"second={chatbot_interface.get_manual_chain()}")
+    finally:
+        chatbot_interface.PDF_FOLDER, process_pdf.get_vector_backend = pdf_folder, get_vector_backend
+        chatbot_interface.MANUAL_CHAIN.update(chain=None, failed_at=None)
+
+
+def test_unavailable_manuals_fall_back_to_no_chain():
+    at = AppTest.from_function(load_manuals_twice, default_timeout=60).run()
+    assert not at.exception
+    assert [m.value for m in at.markdown] == ["first=None", "second=None"]
+    # The second call waits out the retry interval instead of trying again
+    assert len(at.warning) == 1
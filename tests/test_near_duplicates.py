@@ -0,0 +1,47 @@
+from config import NEAR_DUPLICATE_MAX_DISTANCE
+from near_duplicates import SimHashIndex, hamming_distance, simhash
+
+WARRANTY = (
+    "This warranty does not cover damage caused by improper installation, misuse, neglect or "
+    "repairs carried out by anyone other than an authorized service technician. Keep your receipt "
+    "as proof of purchase date for warranty service. The manufacturer will repair or replace any "
+    "part found to be defective in material or workmanship for one year from the date of purchase. "
+    "Labor is covered for the first ninety days only. Parts replaced under warranty are covered for "
+    "the remainder of the original warranty period. This warranty applies only to products used in "
+    "a single family household and does not extend to commercial, rental or institutional use. "
+    "Service calls to instruct you how to use the product, correct the installation or replace house "
+    "fuses are not covered. Some states do not allow the exclusion of incidental or consequential "
+    "damages, so the above limitation may not apply to you."
+)
+
+
+def test_near_identical_texts_are_a_few_bits_apart():
+    for variant in [WARRANTY.replace("authorized", "authorised"), WARRANTY + " See page 4."]:
+        assert hamming_distance(simhash(WARRANTY), simhash(variant)) <= NEAR_DUPLICATE_MAX_DISTANCE
+
+
+def test_unrelated_texts_are_far_apart():
+    other = (
+        "Turn off the power at the breaker before removing the furnace access panel. Replace the "
+        "air filter every three months and check the condensate drain line for clogs each season."
+    )
+    assert hamming_distance(simhash(WARRANTY), simhash(other)) > NEAR_DUPLICATE_MAX_DISTANCE
+
+
+def test_simhash_ignores_case_and_punctuation():
+    assert simhash("Clean the filter.") == simhash("clean THE filter")
+
+
+def test_index_finds_fingerprints_within_the_distance():
+    index = SimHashIndex(max_distance=3)
+    index.add(0b1011 << 40, "a")
+    assert index.find((0b1011 << 40) ^ 0b111) == "a"
+    assert index.find((0b1011 << 40) ^ 0b1111) is None
+
+
+def test_index_returns_the_first_stored_copy():
+    index = SimHashIndex(NEAR_DUPLICATE_MAX_DISTANCE)
+    fingerprint = simhash(WARRANTY)
+    index.add(fingerprint, "first")
+    index.add(fingerprint, "second")
+    assert index.find(fingerprint) == "first"
@@ -0,0 +1,144 @@
+import threading
+from concurrent.futures import Future
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from openai import APIConnectionError, BadRequestError, RateLimitError
+
+import openai_gateway
+from openai_gateway import OpenAIDeadlineExceeded, OpenAIGateway, estimate_request_tokens
+
+REQUEST = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+MESSAGES = [{"role": "user", "content": "How often should I change the furnace filter?"}]
+
+
+class FakeCompletions:
+    """Replays `errors` first, then answers; `gate` holds every call until it is set."""
+
+    def __init__(self, errors=(), gate=None):
+        self.errors = list(errors)
+        self.gate = gate
+        self.calls = 0
+        self.lock = threading.Lock()
+        self.with_raw_response = self
+
+    def create(self, **kwargs):
+        with self.lock:
+            self.calls += 1
+            error = self.errors.pop(0) if self.errors else None
+        if self.gate is not None:
+            self.gate.wait(5)
+        if error is not None:
+            raise error
+        answer = SimpleNamespace(content=f"answer {self.calls}")
+        return SimpleNamespace(headers={}, parse=lambda: SimpleNamespace(choices=[SimpleNamespace(message=answer)]))
+
+
+class FakeClient:
+    def __init__(self, completions):
+        self.chat = SimpleNamespace(completions=completions)
+
+    def with_options(self, **options):
+        return self
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    slept = []
+    monkeypatch.setattr(openai_gateway.time, "sleep", slept.append)
+    return slept
+
+
+def gateway(completions, rate_limit=(1000000, 1000), max_retries=4, deadline_seconds=60):
+    return OpenAIGateway(FakeClient(completions), {}, rate_limit, max_retries, deadline_seconds)
+
+
+def rate_limit_error():
+    response = httpx.Response(429, request=REQUEST, headers={"retry-after-ms": "10"})
+    return RateLimitError("slow down", response=response, body=None)
+
+
+def test_identical_requests_in_flight_share_one_call(monkeypatch):
+    waiting = threading.Semaphore(0)
+
+    class CountingFuture(Future):
+        def result(self, timeout=None):
+            waiting.release()
+            return super().result(timeout)
+
+    monkeypatch.setattr(openai_gateway, "Future", CountingFuture)
+    gate = threading.Event()
+    completions = FakeCompletions(gate=gate)
+    client = gateway(completions)
+    results = []
+
+    def ask():
+        results.append(client.chat.completions.create(model="gpt-4o-mini", messages=MESSAGES))
+
+    threads = [threading.Thread(target=ask) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    # The upstream call is held until the other three callers wait on it
+    for _ in range(3):
+        assert waiting.acquire(timeout=5)
+    gate.set()
+    for thread in threads:
+        thread.join()
+    assert completions.calls == 1
+    assert len({id(result) for result in results}) == 1
+    assert client.in_flight == {}
+
+
+def test_streaming_and_later_requests_are_not_shared():
+    completions = FakeCompletions()
+    client = gateway(completions)
+    client.chat.completions.create(model="gpt-4o-mini", messages=MESSAGES)
+    client.chat.completions.create(model="gpt-4o-mini", messages=MESSAGES)
+    client.chat.completions.create(model="gpt-4o-mini", messages=MESSAGES, stream=True)
+    assert completions.calls == 3
+
+
+def test_transient_errors_are_retried(sleeps):
+    completions = FakeCompletions(errors=[APIConnectionError(request=REQUEST)])
+    response = gateway(completions).chat.completions.create(model="gpt-4o-mini", messages=MESSAGES)
+    assert response.choices[0].message.content == "answer 2"
+    assert len(sleeps) == 1
+
+
+def test_rate_limits_pause_the_model_budget(sleeps):
+    completions = FakeCompletions(errors=[rate_limit_error()])
+    client = gateway(completions)
+    client.chat.completions.create(model="gpt-4o-mini", messages=MESSAGES)
+    assert completions.calls == 2
+    assert client.bucket("gpt-4o-mini").paused_until > 0
+
+
+def test_client_errors_are_not_retried(sleeps):
+    error = BadRequestError("bad", response=httpx.Response(400, request=REQUEST), body=None)
+    completions = FakeCompletions(errors=[error])
+    with pytest.raises(BadRequestError):
+        gateway(completions).chat.completions.create(model="gpt-4o-mini", messages=MESSAGES)
+    assert completions.calls == 1
+
+
+def test_retries_stop_at_the_deadline(sleeps):
+    # The first backoff (at least one second) would overrun a half-second deadline
+    completions = FakeCompletions(errors=[APIConnectionError(request=REQUEST)] * 3)
+    with pytest.raises(APIConnectionError):
+        gateway(completions, deadline_seconds=0.5).chat.completions.create(model="gpt-4o-mini", messages=MESSAGES)
+    assert completions.calls == 1
+
+
+def test_requests_fail_fast_when_the_budget_cannot_free_up_in_time(sleeps):
+    completions = FakeCompletions()
+    client = gateway(completions, rate_limit=(1000000, 1), deadline_seconds=5)
+    client.chat.completions.create(model="gpt-4o-mini", messages=MESSAGES)
+    with pytest.raises(OpenAIDeadlineExceeded):
+        client.chat.completions.create(model="gpt-4o-mini", messages=MESSAGES, max_tokens=10)
+    assert completions.calls == 1
+
+
+def test_token_estimate_counts_images_and_the_completion_cap():
+    messages = [{"role": "user", "content": [{"type": "text", "text": "x" * 40}, {"type": "image_url", "image_url": {}}]}]
+    assert estimate_request_tokens({"messages": messages, "max_tokens": 500}) == 11 + openai_gateway.IMAGE_TOKENS + 500
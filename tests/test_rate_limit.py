@@ -0,0 +1,27 @@
+import pytest
+
+from rate_limit import parse_duration, retry_after_seconds
+
+
+@pytest.mark.parametrize(
+    "value, seconds",
+    [("20ms", 0.02), ("6s", 6), ("1m30.5s", 90.5), ("2h", 7200), ("1.5", 1.5), (3, 3)],
+)
+def test_parse_duration(value, seconds):
+    assert parse_duration(value) == pytest.approx(seconds)
+
+
+@pytest.mark.parametrize("value", [None, "", "soon"])
+def test_parse_duration_rejects_unknown_values(value):
+    assert parse_duration(value) is None
+
+
+def test_retry_after_prefers_headers():
+    assert retry_after_seconds({"retry-after-ms": "250"}, attempt=3) == pytest.approx(0.25)
+    assert retry_after_seconds({"retry-after": "2"}, attempt=3) == 2
+
+
+def test_retry_after_backs_off_exponentially_up_to_the_cap():
+    assert retry_after_seconds(None, attempt=0) == 1
+    assert retry_after_seconds(None, attempt=3) == 8
+    assert retry_after_seconds(None, attempt=10) == 60
@@ -0,0 +1,42 @@
+import numpy as np
+from langchain_core.documents import Document
+
+from vector_backends import LocalBackend
+
+
+def fill(backend, collection_name, count=100, dim=8):
+    vectors = np.random.default_rng(1).standard_normal((count, dim)).astype(np.float32)
+    backend.create_collection(collection_name, dim)
+    ids = [f"p{i}" for i in range(count)]
+    backend.upsert(collection_name, ids, vectors, [Document(page_content=point_id) for point_id in ids])
+    return vectors
+
+
+def test_maintain_compacts_once_enough_rows_are_deleted(tmp_path):
+    backend = LocalBackend(str(tmp_path), compact_deleted_fraction=0.2)
+    fill(backend, "manuals")
+    backend.delete_points("manuals", [f"p{i}" for i in range(10)])
+    assert not backend.maintain("manuals")
+    backend.delete_points("manuals", [f"p{i}" for i in range(10, 20)])
+    assert backend.maintain("manuals")
+    store = backend._store("manuals")
+    assert store.count == len(store) == 80
+
+
+def test_ivf_is_built_and_probed_when_configured(tmp_path):
+    backend = LocalBackend(str(tmp_path), ivf_lists=4, nprobe=2)
+    vectors = fill(backend, "manuals")
+    assert backend.search_kwargs() == {"nprobe": 2}
+    backend.maintain("manuals")
+    store = backend._store("manuals")
+    assert store.centroids is not None and len(store.centroids) == 4
+    best = store.similarity_search_by_vector(vectors[3], k=1, **backend.search_kwargs())[0]
+    assert best.id == "p3"
+
+
+def test_ivf_is_off_by_default(tmp_path):
+    backend = LocalBackend(str(tmp_path))
+    fill(backend, "manuals")
+    backend.maintain("manuals")
+    assert backend.search_kwargs() == {}
+    assert backend._store("manuals").centroids is None
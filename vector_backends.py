@@ -0,0 +1,243 @@
+import json
+import os
+import threading
+
+from local_vector_store import LocalVectorStore
+
+# Collection-level operations used by process_pdf_folder, implemented once per vector store backend.
+
+
+class QdrantBackend:
+    def __init__(self, client, quantization="none", rescore=True, oversampling=3.0, hnsw_m=16, hnsw_ef_construct=100, hnsw_ef=128):
+        self.client = client
+        self.quantization = quantization
+        self.rescore = rescore
+        self.oversampling = oversampling
+        self.hnsw_m = hnsw_m
+        self.hnsw_ef_construct = hnsw_ef_construct
+        self.hnsw_ef = hnsw_ef
+
+    def collection_exists(self, collection_name):
+        return self.client.collection_exists(collection_name)
+
+    def create_collection(self, collection_name, size):
+        from qdrant_client.http import models
+
+        quantization_config = None
+        if self.quantization == "scalar":
+            quantization_config = models.ScalarQuantization(
+                scalar=models.ScalarQuantizationConfig(type=models.ScalarType.INT8, always_ram=True)
+            )
+        elif self.quantization == "binary":
+            quantization_config = models.BinaryQuantization(binary=models.BinaryQuantizationConfig(always_ram=True))
+        elif self.quantization != "none":
+            raise ValueError(f"Unknown quantization {self.quantization!r}")
+        self.client.create_collection(
+            collection_name=collection_name,
+            # With quantized copies in RAM the originals are only read for rescoring, so they can live on disk
+            vectors_config=models.VectorParams(
+                size=size, distance=models.Distance.COSINE, on_disk=quantization_config is not None
+            ),
+            hnsw_config=models.HnswConfigDiff(m=self.hnsw_m, ef_construct=self.hnsw_ef_construct),
+            quantization_config=quantization_config,
+        )
+
+    def search_kwargs(self):
+        from qdrant_client.http import models
+
+        quantization = None
+        if self.quantization != "none":
+            quantization = models.QuantizationSearchParams(rescore=self.rescore, oversampling=self.oversampling)
+        return {"search_params": models.SearchParams(hnsw_ef=self.hnsw_ef, quantization=quantization)}
+
+    def maintain(self, collection_name):
+        # Qdrant's own optimizers vacuum deleted points and index new ones
+        return False
+
+    def create_payload_indexes(self, collection_name, fields):
+        from qdrant_client.http import models
+
+        # Keyword indexes let filtered searches skip chunks of other bots instead of post-filtering them
+        for field in fields:
+            self.client.create_payload_index(
+                collection_name=collection_name,
+                field_name=f"metadata.{field}",
+                field_schema=models.PayloadSchemaType.KEYWORD,
+            )
+
+    def metadata_filter(self, conditions):
+        from qdrant_client.http import models
+
+        return models.Filter(must=[
+            models.FieldCondition(key=f"metadata.{key}", match=models.MatchAny(any=list(values)))
+            for key, values in conditions.items()
+        ])
+
+    def iter_documents(self, collection_name, batch_size=256):
+        from langchain_core.documents import Document
+
+        offset = None
+        while True:
+            points, offset = self.client.scroll(
+                collection_name=collection_name, limit=batch_size, offset=offset, with_payload=True, with_vectors=False
+            )
+            for point in points:
+                payload = point.payload or {}
+                yield Document(id=str(point.id), page_content=payload.get("page_content", ""), metadata=payload.get("metadata") or {})
+            if offset is None:
+                return
+
+    def get_alias_target(self, alias_name):
+        for alias in self.client.get_aliases().aliases:
+            if alias.alias_name == alias_name:
+                return alias.collection_name
+        return None
+
+    def point_alias_to(self, alias_name, collection_name):
+        from qdrant_client.http import models
+
+        # Delete + create in one request so readers never see the alias missing
+        operations = []
+        if self.get_alias_target(alias_name) is not None:
+            operations.append(models.DeleteAliasOperation(delete_alias=models.DeleteAlias(alias_name=alias_name)))
+        operations.append(
+            models.CreateAliasOperation(
+                create_alias=models.CreateAlias(collection_name=collection_name, alias_name=alias_name)
+            )
+        )
+        self.client.update_collection_aliases(change_aliases_operations=operations)
+
+    def delete_points(self, collection_name, point_ids):
+        from qdrant_client.http import models
+
+        if point_ids:
+            self.client.delete(collection_name=collection_name, points_selector=models.PointIdsList(points=point_ids))
+
+    def upsert(self, collection_name, point_ids, vectors, documents):
+        from qdrant_client.http import models
+
+        points = [
+            models.PointStruct(
+                id=point_id,
+                vector=vector,
+                payload={"page_content": doc.page_content, "metadata": doc.metadata},
+            )
+            for point_id, vector, doc in zip(point_ids, vectors, documents)
+        ]
+        self.client.upsert(collection_name=collection_name, points=points)
+
+    def update_metadata(self, collection_name, point_id, values):
+        # Merges into the nested metadata payload without touching the vector
+        self.client.set_payload(collection_name=collection_name, payload=values, points=[point_id], key="metadata")
+
+    def vector_store(self, collection_name, embeddings):
+        from langchain_qdrant import Qdrant
+
+        return Qdrant(client=self.client, collection_name=collection_name, embeddings=embeddings)
+
+
+class LocalBackend:
+    """Collections are subdirectories of `root`; aliases live in `root/aliases.json`."""
+
+    def __init__(self, root, quantization="none", rescore=True, oversampling=3.0, compact_deleted_fraction=0.2, ivf_lists=0, nprobe=8):
+        self.root = root
+        self.quantization = quantization
+        self.rescore = rescore
+        self.oversampling = oversampling
+        self.compact_deleted_fraction = compact_deleted_fraction
+        self.ivf_lists = ivf_lists
+        self.nprobe = nprobe
+        self.lock = threading.Lock()
+        self.stores = {}
+        os.makedirs(root, exist_ok=True)
+
+    def _aliases_path(self):
+        return os.path.join(self.root, "aliases.json")
+
+    def _aliases(self):
+        if not os.path.exists(self._aliases_path()):
+            return {}
+        with open(self._aliases_path(), "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _store(self, collection_name, size=None):
+        with self.lock:
+            if collection_name not in self.stores:
+                # Quantization only applies when the collection is created; existing ones keep their own
+                self.stores[collection_name] = LocalVectorStore(
+                    os.path.join(self.root, collection_name),
+                    dim=size,
+                    quantization=self.quantization,
+                    oversampling=self.oversampling,
+                    rescore=self.rescore,
+                )
+            return self.stores[collection_name]
+
+    def resolve(self, name):
+        return self._aliases().get(name, name)
+
+    def collection_exists(self, collection_name):
+        return os.path.isdir(os.path.join(self.root, collection_name))
+
+    def create_collection(self, collection_name, size):
+        if self.collection_exists(collection_name):
+            raise ValueError(f"Collection '{collection_name}' already exists")
+        self._store(collection_name, size)
+
+    def search_kwargs(self):
+        # Rescoring and oversampling are configured on the store itself
+        return {"nprobe": self.nprobe} if self.ivf_lists else {}
+
+    def maintain(self, collection_name):
+        """Drop deleted rows once they pass the configured share and keep the IVF lists current.
+
+        Returns whether the collection was compacted.
+        """
+        store = self._store(collection_name)
+        compacted = store.count > 0 and store.deleted_fraction() >= self.compact_deleted_fraction
+        if compacted:
+            store.compact()
+        # Rows added since the last build join their nearest list; reclustering waits for the next compaction
+        if self.ivf_lists and len(store) and (compacted or store.centroids is None):
+            store.build_ivf(self.ivf_lists)
+        return compacted
+
+    def create_payload_indexes(self, collection_name, fields):
+        self._store(collection_name).create_metadata_indexes(fields)
+
+    def metadata_filter(self, conditions):
+        return {key: list(values) for key, values in conditions.items()}
+
+    def iter_documents(self, collection_name):
+        return self._store(self.resolve(collection_name)).iter_documents()
+
+    def get_alias_target(self, alias_name):
+        return self._aliases().get(alias_name)
+
+    def point_alias_to(self, alias_name, collection_name):
+        aliases = self._aliases()
+        aliases[alias_name] = collection_name
+        tmp_path = f"{self._aliases_path()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(aliases, f, indent=2)
+        os.replace(tmp_path, self._aliases_path())
+
+    def delete_points(self, collection_name, point_ids):
+        if point_ids:
+            self._store(collection_name).delete(point_ids)
+
+    def upsert(self, collection_name, point_ids, vectors, documents):
+        self._store(collection_name).add_embeddings(
+            [doc.page_content for doc in documents],
+            vectors,
+            [doc.metadata for doc in documents],
+            point_ids,
+        )
+
+    def update_metadata(self, collection_name, point_id, values):
+        self._store(collection_name).update_metadata(point_id, values)
+
+    def vector_store(self, collection_name, embeddings):
+        store = self._store(self.resolve(collection_name))
+        store.set_embeddings(embeddings)
+        return store